@@ -1,8 +1,12 @@
 import logging
 import os
+import socket
+import time
 from typing import Annotated, Optional
 
+import numpy as np
 import vtk
+from vtk.util.numpy_support import vtk_to_numpy
 
 import slicer, qt
 from slicer.i18n import tr as _
@@ -16,6 +20,11 @@ from slicer.parameterNodeWrapper import (
 
 from slicer import vtkMRMLScalarVolumeNode
 
+from Example_ProgramLib import EventLog, IntegrityAudit
+from Example_ProgramLib.ExamGenerator import readExamBank
+from Example_ProgramLib.FrameTimer import FrameTimer
+from Example_ProgramLib.ResultsCollector import ResultsClient
+
 BIG_BRAIN = "Big_Brain"
 IN_VIVO = "in_vivo"
 EX_VIVO = "ex_vivo"
@@ -24,9 +33,54 @@ BIG_BRAIN_VOLUME_NAME = "vtkMRMLScalarVolumeNode3"
 IN_VIVO_VOLUME_NAME = "vtkMRMLScalarVolumeNode1"
 EX_VIVO_VOLUME_NAME = "vtkMRMLScalarVolumeNode2"
 
+DATASET_VOLUME_IDS = {
+    BIG_BRAIN: BIG_BRAIN_VOLUME_NAME,
+    IN_VIVO: IN_VIVO_VOLUME_NAME,
+    EX_VIVO: EX_VIVO_VOLUME_NAME,
+}
+
+# Layout där varje dataset har egna vyer (en kolumn per dataset)
+MULTI_DATASET_LAYOUT_ID = 5001
+MULTI_DATASET_VIEWS = {
+    BIG_BRAIN: ("BigBrainAxial", "BigBrainSagittal", "BigBrainCoronal"),
+    IN_VIVO: ("InVivoAxial", "InVivoSagittal", "InVivoCoronal"),
+    EX_VIVO: ("ExVivoAxial", "ExVivoSagittal", "ExVivoCoronal"),
+}
+MULTI_DATASET_VIEW_COLORS = ("#F34A33", "#EDD54C", "#6EB04B")
+
+# Kontrollsummor för filerna som registreras i registerSampleData, används även vid integritetskontroll
+SAMPLE_DATA_CHECKSUMS = {
+    "Example_Program1.nrrd": "SHA256:998cb522173839c78657f4bc0ea907cea09fd04e44601f17c82ea27927937b95",
+    "Example_Program2.nrrd": "SHA256:1a64f3f422eb3d1c9b093d1a18da354b13bcf307907c66317e2463ee530b7a97",
+}
+INTEGRITY_CACHE_FILE_NAME = "BV4_Integrity_Cache.json"
+
+# Attribut på examens markups-nod med information som behövs vid export
+EXAM_NR_ATTRIBUTE = "Example_Program.ExamNr"
+STUDENT_NAME_ATTRIBUTE = "Example_Program.StudentName"
+DATASETS_ATTRIBUTE = "Example_Program.Datasets"
+
 NUMBER_OF_QUESTIONS = 10
 Q_MESSAGE_BOX_TITLE = "BV4 Example program"
 
+# Adress till resultatinsamlaren, se Example_ProgramLib/ResultsCollector.py
+RESULTS_COLLECTOR_HOST = os.environ.get("BV4_RESULTS_COLLECTOR_HOST", "127.0.0.1")
+RESULTS_COLLECTOR_PORT = int(os.environ.get("BV4_RESULTS_COLLECTOR_PORT", "8765"))
+RESULTS_SPOOL_DIRECTORY_NAME = "BV4_Results_Spool"
+
+# Begränsa uppdateringsfrekvensen i vyer som inte är under muspekaren medan en control point
+# placeras, så att vyn som används renderas utan fördröjning
+LOW_LATENCY_PLACEMENT = True
+# Under placering renderas vyer som inte är under muspekaren med denna frekvens (bilder per sekund)
+INACTIVE_VIEW_UPDATE_RATE = 5.0
+
+# Examensbanken med frågorna för varje exam nr. Nya examina kan genereras med
+# Example_ProgramLib/ExamGenerator.py från samma fil.
+EXAM_BANK_PATH = os.environ.get("BV4_EXAM_BANK", os.path.join(os.path.dirname(__file__), "Resources", "ExamBank.json"))
+
+# Händelseloggar för att kunna spela upp en session igen, se Example_ProgramLib/EventLog.py
+EVENT_LOG_DIRECTORY_NAME = "BV4_Event_Logs"
+
 
 #
 # Example_Program
@@ -93,7 +147,7 @@ def registerSampleData():
         fileNames="Example_Program1.nrrd",
         # Checksum to ensure file integrity. Can be computed by this command:
         #  import hashlib; print(hashlib.sha256(open(filename, "rb").read()).hexdigest())
-        checksums="SHA256:998cb522173839c78657f4bc0ea907cea09fd04e44601f17c82ea27927937b95",
+        checksums=SAMPLE_DATA_CHECKSUMS["Example_Program1.nrrd"],
         # This node name will be used when the data set is loaded
         nodeNames="Example_Program1",
     )
@@ -107,7 +161,7 @@ def registerSampleData():
         # Download URL and target file name
         uris="https://github.com/Slicer/SlicerTestingData/releases/download/SHA256/1a64f3f422eb3d1c9b093d1a18da354b13bcf307907c66317e2463ee530b7a97",
         fileNames="Example_Program2.nrrd",
-        checksums="SHA256:1a64f3f422eb3d1c9b093d1a18da354b13bcf307907c66317e2463ee530b7a97",
+        checksums=SAMPLE_DATA_CHECKSUMS["Example_Program2.nrrd"],
         # This node name will be used when the data set is loaded
         nodeNames="Example_Program2",
     )
@@ -206,13 +260,23 @@ class Example_ProgramWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         self.ui.pushButton_Place_Structure_10.connect("clicked(bool)", lambda: self.onPlaceStructureButton(10))
 
         self.ui.pushButton_Save_And_Quit.connect("clicked(bool)", self.onSaveAndQuitButton)
+        self.ui.checkBox_Multi_Dataset_Layout.connect("toggled(bool)", self.onMultiDatasetLayoutToggled)
 
         # Make sure parameter node is initialized (needed for module reload)
         self.initializeParameterNode()
 
+        eventLogDirectory = os.path.join(slicer.app.temporaryPath, EVENT_LOG_DIRECTORY_NAME)
+        os.makedirs(eventLogDirectory, exist_ok=True)
+        # En loggfil per start av programmet
+        self.logic.startEventLog(os.path.join(eventLogDirectory, f"{time.strftime('%Y-%m-%d_%H%M%S')}_{os.getpid()}.bv4log"))
+        # Startar sändningen direkt så att resultat som blev kvar från en tidigare session skickas
+        self.logic.getResultsClient()
+
     def cleanup(self) -> None:
         """Called when the application closes and the module widget is destroyed."""
         self.removeObservers()
+        if self.logic:
+            self.logic.cleanup()
 
     def enter(self) -> None:
         """Called each time the user opens this module."""
@@ -367,12 +431,90 @@ class Example_ProgramWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
                 self.ui.pushButton_Place_Structure_9.setText(self.logic.place_structure_buttons_texts[8])
                 self.ui.pushButton_Place_Structure_10.setText(self.logic.place_structure_buttons_texts[9])
 
+    def onMultiDatasetLayoutToggled(self, enabled) -> None:
+        with slicer.util.tryWithErrorDisplay(_("Failed to change layout."), waitCursor=True):
+            self.logic.setMultiDatasetLayout(enabled)
+
+#
+# ControlPointWorldIndex
+#
+
+
+class ControlPointWorldIndex(VTKObservationMixin):
+    """World coordinates and position status of all control points in a markups node.
+
+    The arrays are computed on first use and then only updated for the control points
+    that have been modified since. Adding or removing points, or a change of the node's
+    parent transform, recomputes all points with one bulk call.
+    """
+
+    def __init__(self, node) -> None:
+        VTKObservationMixin.__init__(self)
+        self.node = node
+        self.positions = np.zeros((0, 3))
+        self.states = np.zeros(0, dtype=np.int8)
+        self._modifiedPoints = set()
+        self._fullUpdateNeeded = True
+        for event in (slicer.vtkMRMLMarkupsNode.PointModifiedEvent,
+                      slicer.vtkMRMLMarkupsNode.PointPositionDefinedEvent,
+                      slicer.vtkMRMLMarkupsNode.PointPositionUndefinedEvent):
+            self.addObserver(node, event, self.onPointModified)
+        for event in (slicer.vtkMRMLMarkupsNode.PointAddedEvent,
+                      slicer.vtkMRMLMarkupsNode.PointRemovedEvent,
+                      slicer.vtkMRMLTransformableNode.TransformModifiedEvent):
+            self.addObserver(node, event, self.onAllPointsModified)
+
+    def release(self) -> None:
+        self.removeObservers()
+        self.node = None
+
+    @vtk.calldata_type(vtk.VTK_INT)
+    def onPointModified(self, caller, event, index) -> None:
+        if index is None or index < 0:
+            self._fullUpdateNeeded = True
+        else:
+            self._modifiedPoints.add(index)
+
+    def onAllPointsModified(self, caller, event) -> None:
+        self._fullUpdateNeeded = True
+
+    def getArrays(self):
+        """Return the up-to-date positions (N x 3, world coordinates) and position status arrays."""
+        if self._fullUpdateNeeded:
+            self._updateAllPoints()
+        elif self._modifiedPoints:
+            position = [0.0, 0.0, 0.0]
+            for index in self._modifiedPoints:
+                if index >= len(self.positions):
+                    self._updateAllPoints()
+                    break
+                self.node.GetNthControlPointPositionWorld(index, position)
+                self.positions[index] = position
+                self.states[index] = self.node.GetNthControlPointPositionStatus(index)
+            self._modifiedPoints.clear()
+        return self.positions, self.states
+
+    def _updateAllPoints(self) -> None:
+        points = vtk.vtkPoints()
+        self.node.GetControlPointPositionsWorld(points)
+        numberOfControlPoints = points.GetNumberOfPoints()
+        if numberOfControlPoints == 0:
+            self.positions = np.zeros((0, 3))
+        else:
+            self.positions = vtk_to_numpy(points.GetData()).astype(np.float64)
+        # Positionsstatus saknar ett motsvarande anrop för alla punkter
+        self.states = np.fromiter((self.node.GetNthControlPointPositionStatus(i) for i in range(numberOfControlPoints)),
+                                  dtype=np.int8, count=numberOfControlPoints)
+        self._modifiedPoints.clear()
+        self._fullUpdateNeeded = False
+
+
 #
 # Example_ProgramLogic
 #
 
 
-class Example_ProgramLogic(ScriptedLoadableModuleLogic):
+class Example_ProgramLogic(ScriptedLoadableModuleLogic, VTKObservationMixin):
     """This class should implement all the actual
     computation done by your module.  The interface
     should be such that other python code can import
@@ -385,6 +527,7 @@ class Example_ProgramLogic(ScriptedLoadableModuleLogic):
     def __init__(self) -> None:
         """Called when the logic class is instantiated. Can be used for initializing member variables."""
         ScriptedLoadableModuleLogic.__init__(self)
+        VTKObservationMixin.__init__(self)
         self.exam_active = False
         self.structures = []
         self.current_dataset = ""
@@ -396,6 +539,34 @@ class Example_ProgramLogic(ScriptedLoadableModuleLogic):
         self.setStructureButtonsText()
         self.place_structure_buttons_texts = [""] * NUMBER_OF_QUESTIONS
         self.setPlaceStructureButtonsText()
+        self.results_client = None
+        self.low_latency_placement = LOW_LATENCY_PLACEMENT
+        self.placement_views = {}
+        self.placement_view_names = {}
+        self.placement_3d_views = []
+        self.placement_update_rates = {}
+        self.placement_active_views = []
+        self.frame_timer = None
+        self.event_log = None
+        self.replaying = False
+        self.resetting_control_point = False
+        self.exam_bank = None
+        self.exam_bank_path = EXAM_BANK_PATH
+        self.multi_dataset_layout = False
+        self.previous_layout = None
+        self.world_indices = {}
+
+    def cleanup(self):
+        self.stopPlacementRendering()
+        for worldIndex in self.world_indices.values():
+            worldIndex.release()
+        self.world_indices = {}
+        if self.event_log is not None:
+            self.event_log.close()
+            self.event_log = None
+        if self.results_client is not None:
+            self.results_client.close()
+            self.results_client = None
 
     def getParameterNode(self):
         return Example_ProgramParameterNode(super().getParameterNode())
@@ -447,21 +618,33 @@ class Example_ProgramLogic(ScriptedLoadableModuleLogic):
         self.student_name = ""
         self.exam_nr = 0
 
+    # Visar en varning, eller loggar den när en session spelas upp
+    def showWarning(self, text):
+        if self.replaying:
+            logging.warning(text)
+            return
+        qt.QMessageBox.warning(slicer.util.mainWindow(), Q_MESSAGE_BOX_TITLE, text)
+
+    # Ställer en ja/nej-fråga. Vid uppspelning är svaret alltid ja, eftersom endast
+    # bekräftade handlingar loggas.
+    def askQuestion(self, text):
+        if self.replaying:
+            return True
+        reply = qt.QMessageBox.question(slicer.util.mainWindow(), Q_MESSAGE_BOX_TITLE, text,
+                                        qt.QMessageBox.Yes | qt.QMessageBox.No)
+        return reply == qt.QMessageBox.Yes
+
     def onLoadStructuresButtonPressed(self, student_name, exam_nr):
         if self.exam_active:
-            qt.QMessageBox.warning(slicer.util.mainWindow(), Q_MESSAGE_BOX_TITLE,
-                                   f"Kan ej ladda in strukturer medan en exam är aktiv.")
+            self.showWarning(f"Kan ej ladda in strukturer medan en exam är aktiv.")
             return -1
         if len(student_name.split()) < 2:
             # Kanske även kolla att endast innehåller a-ö och mellanslag
-            qt.QMessageBox.warning(slicer.util.mainWindow(), Q_MESSAGE_BOX_TITLE,
-                                   f"Ange både för- och efternamn.")
+            self.showWarning(f"Ange både för- och efternamn.")
             return -1
-        reply = qt.QMessageBox.question(slicer.util.mainWindow(), Q_MESSAGE_BOX_TITLE,
-                                        f"Har du angett rätt namn och exam nr?\nNamn: {student_name}\nExam nr: {exam_nr}",
-                                        qt.QMessageBox.Yes | qt.QMessageBox.No)
-        if reply == qt.QMessageBox.No:
+        if not self.askQuestion(f"Har du angett rätt namn och exam nr?\nNamn: {student_name}\nExam nr: {exam_nr}"):
             return -1
+        self.logEvent(EventLog.LOAD, student_name, exam_nr)
         self.student_name = student_name
         self.exam_nr = exam_nr
         self.retrieveStructures(int(self.exam_nr))
@@ -469,7 +652,7 @@ class Example_ProgramLogic(ScriptedLoadableModuleLogic):
             # Måste nog göra reset då
             print(len(self.structures))
             print(self.exam_nr)
-            qt.QMessageBox.warning(slicer.util.mainWindow(), Q_MESSAGE_BOX_TITLE, f"Inga strukturer kunde hittas för exam nr: {exam_nr}.")
+            self.showWarning(f"Inga strukturer kunde hittas för exam nr: {exam_nr}.")
             return -1
         self.addNodeAndControlPoints(exam_nr, student_name, self.structures)
         self.exam_active = True
@@ -481,10 +664,11 @@ class Example_ProgramLogic(ScriptedLoadableModuleLogic):
     def onStructureButtonPressed(self, number):
         if not self.exam_active:
             return -1
+        self.logEvent(EventLog.STRUCTURE_CLICK, number)
         self.updateAnsweredQuestions()
         self.setPlaceStructureButtonsText()
         self.changeDataset(self.structures[number - 1]["Dataset"])
-        slicer.modules.markups.logic().JumpSlicesToLocation(0, 0, 0, True)
+        self.jumpSlicesToLocation(0, 0, 0)
         self.node.GetDisplayNode().SetActiveControlPoint(number - 1)
         if self.checkIfControlPointExists(number):
             self.centreOnControlPoint(self.node, number - 1, self.structures[number - 1]["Dataset"])
@@ -496,31 +680,127 @@ class Example_ProgramLogic(ScriptedLoadableModuleLogic):
         self.setPlaceStructureButtonsText()
         self.changeDataset(self.structures[number - 1]["Dataset"])
         if self.answered_questions[number - 1]:
-            reply = qt.QMessageBox.question(slicer.util.mainWindow(), Q_MESSAGE_BOX_TITLE,
-                                            f"Du har redan placerat ut denna struktur.\nÄr du säker på att du vill placera om den?",
-                                            qt.QMessageBox.Yes | qt.QMessageBox.No)
-            if reply == qt.QMessageBox.No:
+            if not self.askQuestion(f"Du har redan placerat ut denna struktur.\nÄr du säker på att du vill placera om den?"):
                 return
+        self.logEvent(EventLog.PLACE_CLICK, number)
         self.setNewControlPoint(self.node, number - 1)
 
     def onSaveAndQuitButtonPressed(self):
         # Återställer fönstrena och byter till big brain vid ny användare
         if not self.exam_active:
-            qt.QMessageBox.warning(slicer.util.mainWindow(), Q_MESSAGE_BOX_TITLE,
-                                   f"Kan inte spara när ingen exam pågår.")
+            self.showWarning(f"Kan inte spara när ingen exam pågår.")
             return -1
-        reply = qt.QMessageBox.question(slicer.util.mainWindow(), Q_MESSAGE_BOX_TITLE,
-                                        f"Är du säker på att du vill avsluta?",
-                                        qt.QMessageBox.Yes | qt.QMessageBox.No)
-        if reply == qt.QMessageBox.No:
+        if not self.askQuestion(f"Är du säker på att du vill avsluta?"):
             return -1
-        slicer.mrmlScene.RemoveNode(self.node)
+        self.logEvent(EventLog.SAVE)
+        self.stopPlacementRendering()
+        # Resultatet skickas i bakgrunden så att stationen inte väntar på nätverket.
+        # Uppspelade sessioner skickas inte.
+        if not self.replaying:
+            self.getResultsClient().submit(self.getExamResult())
+        node = self.node
+        # Noden kopplas loss innan vyerna återställs så att den inte används efter att den tagits bort
+        self.node = None
+        self.removeObserver(node, slicer.vtkMRMLMarkupsNode.PointPositionDefinedEvent, self.onControlPointPositionDefined)
+        self.releaseWorldIndex(node)
+        slicer.mrmlScene.RemoveNode(node)
         self.resetWindow()
         self.resetAnsweredQuestions()
         self.reset()
         self.setStructureButtonsText()
         self.setPlaceStructureButtonsText()
 
+    def startEventLog(self, path):
+        if self.event_log is not None:
+            self.event_log.close()
+        self.event_log = EventLog.EventLogWriter(path)
+
+    def logEvent(self, eventType, *fields):
+        if self.event_log is None or self.replaying:
+            return
+        try:
+            self.event_log.write(eventType, *fields)
+        except OSError as e:
+            # Examen ska kunna fortsätta även om loggen inte kan skrivas
+            logging.error(f"Could not write to event log: {e}")
+
+    @vtk.calldata_type(vtk.VTK_INT)
+    def onControlPointPositionDefined(self, caller, event, index):
+        if self.resetting_control_point:
+            return
+        position = caller.GetNthControlPointPosition(index)
+        self.logEvent(EventLog.POINT_PLACED, index, *position)
+
+    # Spelar upp en loggad session (index i EventLog.splitSessions, som standard den sista).
+    # Med realTime=True används originalets tidtagning, annars körs händelserna så snabbt
+    # som möjligt. Returnerar tiden för varje händelse.
+    def replayEventLog(self, path, session=-1, realTime=False, speed=1.0):
+        handlers = {
+            EventLog.LOAD: self.onLoadStructuresButtonPressed,
+            EventLog.STRUCTURE_CLICK: self.onStructureButtonPressed,
+            EventLog.PLACE_CLICK: self.onPlaceStructureButtonPressed,
+            EventLog.POINT_PLACED: self.replayPointPlaced,
+            EventLog.SAVE: self.onSaveAndQuitButtonPressed,
+            # Byte av dataset sker redan i knapphändelserna och spelas inte upp separat
+        }
+        sessions = EventLog.splitSessions(EventLog.readEventLog(path))
+        if not sessions:
+            raise ValueError(f"{path} contains no sessions")
+        events = sessions[session]
+        replayer = EventLog.EventReplayer(handlers, realTime=realTime, speed=speed, wait=self.waitProcessingEvents)
+        # Sessionen börjar utan aktiv exam, även om en tidigare session aldrig sparades.
+        # Noden från en pågående exam lämnas kvar i scenen.
+        self.stopPlacementRendering()
+        if self.node is not None:
+            self.removeObserver(self.node, slicer.vtkMRMLMarkupsNode.PointPositionDefinedEvent, self.onControlPointPositionDefined)
+        self.reset()
+        self.replaying = True
+        try:
+            timings = replayer.replay(events)
+        finally:
+            self.replaying = False
+        logging.info(f"Replayed {len(timings)} events from {path}:\n{EventLog.summarizeTimings(timings)}")
+        return timings
+
+    def replayPointPlaced(self, index, x, y, z):
+        self.node.SetNthControlPointPosition(index, x, y, z)
+        interactionNode = slicer.mrmlScene.GetNodeByID("vtkMRMLInteractionNodeSingleton")
+        interactionNode.SwitchToViewTransformMode()
+
+    def waitProcessingEvents(self, seconds):
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            slicer.app.processEvents()
+            time.sleep(min(0.01, max(0.0, deadline - time.monotonic())))
+
+    def getResultsClient(self):
+        if self.results_client is None:
+            spoolDirectory = os.path.join(slicer.app.temporaryPath, RESULTS_SPOOL_DIRECTORY_NAME)
+            self.results_client = ResultsClient(RESULTS_COLLECTOR_HOST, RESULTS_COLLECTOR_PORT, spoolDirectory)
+        return self.results_client
+
+    # Sammanställer examens resultat som skickas till resultatinsamlaren
+    def getExamResult(self):
+        self.updateAnsweredQuestions()
+        positions, _states = self.getControlPointArrays(self.node)
+        questions = []
+        for i in range(self.node.GetNumberOfControlPoints()):
+            structure = self.structures[i] if i < len(self.structures) else {}
+            questions.append({
+                "question": i + 1,
+                "Structure": self.node.GetNthControlPointLabel(i),
+                "Dataset": structure.get("Dataset", ""),
+                "answered": self.answered_questions[i],
+                "position": positions[i].tolist(),
+            })
+        return {
+            "student_name": self.student_name,
+            "exam_nr": self.exam_nr,
+            "station": socket.gethostname(),
+            "saved_at": time.time(),
+            "questions": questions,
+        }
+
     def setStructureButtonsText(self, structures=None):
         for i in range(len(self.structure_buttons_texts)):
             if structures is None:
@@ -548,180 +828,129 @@ class Example_ProgramLogic(ScriptedLoadableModuleLogic):
             compositeNode = sliceLogic.GetSliceCompositeNode()
             compositeNode.SetBackgroundVolumeID(str(a))
 
+    # Visar dataset i vyerna. I layouten med alla dataset sida vid sida byts bara fokus,
+    # annars byts bakgrundsvolymen i alla vyer.
+    def showDataset(self, dataset):
+        if self.multi_dataset_layout:
+            self.focusDatasetViews(dataset)
+        else:
+            self.displaySelectVolume(DATASET_VOLUME_IDS[dataset])
+
+    def jumpSlicesToLocation(self, x, y, z):
+        if self.multi_dataset_layout and self.current_dataset in MULTI_DATASET_VIEWS:
+            # Endast det aktiva datasetets vyer flyttas så att övriga vyer inte behöver räknas om
+            layoutManager = slicer.app.layoutManager()
+            for viewName in MULTI_DATASET_VIEWS[self.current_dataset]:
+                layoutManager.sliceWidget(viewName).mrmlSliceNode().JumpSliceByCentering(x, y, z)
+        else:
+            slicer.modules.markups.logic().JumpSlicesToLocation(x, y, z, True)
+
+    def getMultiDatasetLayoutDescription(self):
+        columns = []
+        for group, viewNames in enumerate(MULTI_DATASET_VIEWS.values()):
+            items = []
+            for index, (viewName, orientation, color) in enumerate(zip(viewNames, ("Axial", "Sagittal", "Coronal"), MULTI_DATASET_VIEW_COLORS)):
+                # Kort etikett i vyns kontrollfält, t.ex. "B1" för Big_Brain axial
+                viewLabel = f"{viewName[0]}{index + 1}"
+                items.append(f"""
+    <item>
+     <view class="vtkMRMLSliceNode" singletontag="{viewName}">
+      <property name="orientation" action="default">{orientation}</property>
+      <property name="viewlabel" action="default">{viewLabel}</property>
+      <property name="viewcolor" action="default">{color}</property>
+      <property name="viewgroup" action="default">{group}</property>
+     </view>
+    </item>""")
+            columns.append(f"""
+  <item>
+   <layout type="vertical">{"".join(items)}
+   </layout>
+  </item>""")
+        return f"""<layout type="horizontal">{"".join(columns)}
+</layout>"""
+
+    # Byter till en layout där Big_Brain, in_vivo och ex_vivo har egna vyer. Vyer som
+    # tillhör andra dataset än det aktiva pausas så att de inte renderas om.
+    def setMultiDatasetLayout(self, enabled):
+        if enabled == self.multi_dataset_layout:
+            return
+        layoutManager = slicer.app.layoutManager()
+        layoutNode = layoutManager.layoutLogic().GetLayoutNode()
+        if enabled:
+            if not layoutNode.IsLayoutDescription(MULTI_DATASET_LAYOUT_ID):
+                layoutNode.AddLayoutDescription(MULTI_DATASET_LAYOUT_ID, self.getMultiDatasetLayoutDescription())
+            self.previous_layout = layoutManager.layout
+            layoutManager.setLayout(MULTI_DATASET_LAYOUT_ID)
+            for dataset, viewNames in MULTI_DATASET_VIEWS.items():
+                for viewName in viewNames:
+                    sliceLogic = layoutManager.sliceWidget(viewName).sliceLogic()
+                    sliceLogic.GetSliceCompositeNode().SetBackgroundVolumeID(DATASET_VOLUME_IDS[dataset])
+                    sliceLogic.FitSliceToAll()
+            self.multi_dataset_layout = True
+            self.focusDatasetViews(self.current_dataset or BIG_BRAIN)
+        else:
+            self.multi_dataset_layout = False
+            for viewNames in MULTI_DATASET_VIEWS.values():
+                for viewName in viewNames:
+                    layoutManager.sliceWidget(viewName).sliceView().setRenderPaused(False)
+            if self.node is not None:
+                self.node.GetDisplayNode().RemoveAllViewNodeIDs()
+            layoutManager.setLayout(self.previous_layout)
+            if self.current_dataset:
+                self.changeDataset(self.current_dataset)
+
+    def focusDatasetViews(self, dataset):
+        self.current_dataset = dataset
+        layoutManager = slicer.app.layoutManager()
+        for viewDataset, viewNames in MULTI_DATASET_VIEWS.items():
+            for viewName in viewNames:
+                view = layoutManager.sliceWidget(viewName).sliceView()
+                view.setRenderPaused(viewDataset != dataset)
+                if viewDataset == dataset:
+                    view.scheduleRender()
+        activeViews = MULTI_DATASET_VIEWS.get(dataset, ())
+        if activeViews:
+            layoutManager.sliceWidget(activeViews[0]).sliceView().setFocus()
+        displayNode = self.node.GetDisplayNode() if self.node is not None else None
+        if displayNode is not None:
+            # Control points visas bara i det aktiva datasetets vyer
+            activeViewNodeIDs = [layoutManager.sliceWidget(viewName).mrmlSliceNode().GetID() for viewName in activeViews]
+            displayNode.SetViewNodeIDs(activeViewNodeIDs)
+
     # Byter dataset till big brain och fokuserar på koordinaterna [0, 0, 0]
     def resetWindow(self):
         self.changeDataset(BIG_BRAIN)
-        slicer.modules.markups.logic().JumpSlicesToLocation(0, 0, 0, True)
+        self.jumpSlicesToLocation(0, 0, 0)
 
-    # Läser in alla rader tillhörande exam_nr
+    # Läser in frågorna tillhörande exam_nr från examensbanken
     def retrieveStructures(self, exam_nr) -> list:
-        structures = {
-            241: [{'Structure': 'nucleus caudatus',
-                'Dataset': 'Big_Brain',
-                'question': '1'},
-               {'Structure': 'Mesencephalon',
-                'Dataset': 'Big_Brain',
-                'question': '2'},
-               {'Structure': 'foramen interventriculare',
-                'Dataset': 'in_vivo',
-                'question': '3'},
-               {'Structure': 'lobus cerebelli posterior',
-                'Dataset': 'in_vivo',
-                'question': '4'},
-               {'Structure': 'Sulcus marginalis',
-                'Dataset': 'in_vivo',
-                'question': '5'},
-               {'Structure': 'Nodulus',
-                'Dataset': 'in_vivo',
-                'question': '6'},
-               {'Structure': 'Cortex piriformis',
-                'Dataset': 'ex_vivo',
-                'question': '7'},
-               {'Structure': 'Thalamus',
-                'Dataset': 'ex_vivo',
-                'question': '8'},
-               {'Structure': 'Tonsilla',
-                'Dataset': 'ex_vivo',
-                'question': '9'},
-               {'Structure': 'Fasciculus longitidinalis inferior',
-                'Dataset': 'Tracts_3D',
-                'question': '10'}],
-         242: [{'Structure': 'sulcus collateralis',
-                'Dataset': 'Big_Brain',
-                'question': '1'},
-               {'Structure': 'Lamina terminalis',
-                'Dataset': 'Big_Brain',
-                'question': '2'},
-               {'Structure': 'a. cerebri posterior (P4)',
-                'Dataset': 'in_vivo',
-                'question': '3'},
-               {'Structure': 'capsula interna',
-                'Dataset': 'in_vivo',
-                'question': '4'},
-               {'Structure': 'Colliculus superior',
-                'Dataset': 'in_vivo',
-                'question': '5'},
-               {'Structure': 'lobus cerebelli anterior',
-                'Dataset': 'in_vivo',
-                'question': '6'},
-               {'Structure': 'Putamen',
-                'Dataset': 'in_vivo',
-                'question': '7'},
-               {'Structure': 'sinus sigmoideus',
-                'Dataset': 'in_vivo',
-                'question': '8'},
-               {'Structure': 'Thalamus',
-                'Dataset': 'ex_vivo',
-                'question': '9'},
-               {'Structure': 'Ventriculus lateralis',
-                'Dataset': 'ex_vivo',
-                'question': '10'}],
-         243: [{'Structure': 'Nucleus accumbens',
-                'Dataset': 'Big_Brain',
-                'question': '1'},
-               {'Structure': 'Area postrema',
-                'Dataset': 'Big_Brain',
-                'question': '2'},
-               {'Structure': 'Operculum parietale',
-                'Dataset': 'Big_Brain',
-                'question': '3'},
-               {'Structure': 'a. cerebri anterior',
-                'Dataset': 'in_vivo',
-                'question': '4'},
-               {'Structure': 'aqueductus cerebri/mesencephali',
-                'Dataset': 'in_vivo',
-                'question': '5'},
-               {'Structure': 'falx cerebri',
-                'Dataset': 'in_vivo',
-                'question': '6'},
-               {'Structure': 'Sinus rectus',
-                'Dataset': 'in_vivo',
-                'question': '7'},
-               {'Structure': 'Flocculus',
-                'Dataset': 'ex_vivo',
-                'question': '8'},
-               {'Structure': 'hemispherium cerebelli',
-                'Dataset': 'ex_vivo',
-                'question': '9'},
-               {'Structure': 'Medulla oblongata',
-                'Dataset': 'ex_vivo',
-                'question': '10'}],
-         244: [{'Structure': 'basis pontis',
-                'Dataset': 'Big_Brain',
-                'question': '1'},
-               {'Structure': 'a. lenticulostriatae laterales',
-                'Dataset': 'in_vivo',
-                'question': '2'},
-               {'Structure': 'capsula externa',
-                'Dataset': 'in_vivo',
-                'question': '3'},
-               {'Structure': 'Corpus callosum rostrum',
-                'Dataset': 'in_vivo',
-                'question': '4'},
-               {'Structure': 'pedunculus cerebellaris inferior',
-                'Dataset': 'in_vivo',
-                'question': '5'},
-               {'Structure': 'Ventriculus lateralis',
-                'Dataset': 'in_vivo',
-                'question': '6'},
-               {'Structure': 'capsula extrema',
-                'Dataset': 'ex_vivo',
-                'question': '7'},
-               {'Structure': 'Hippocampus',
-                'Dataset': 'ex_vivo',
-                'question': '8'},
-               {'Structure': 'plexus choroideus',
-                'Dataset': 'ex_vivo',
-                'question': '9'},
-               {'Structure': 'sulcus hypothalamicus',
-                'Dataset': 'ex_vivo',
-                'question': '10'}],
-         245: [{'Structure': 'pyramis medullae oblongatae',
-                'Dataset': 'Big_Brain',
-                'question': '1'},
-               {'Structure': 'Ventriculus lateralis',
-                'Dataset': 'Big_Brain',
-                'question': '2'},
-               {'Structure': 'Mesencephalon',
-                'Dataset': 'Big_Brain',
-                'question': '3'},
-               {'Structure': 'Cuneus',
-                'Dataset': 'Big_Brain',
-                'question': '4'},
-               {'Structure': 'Operculum parietale',
-                'Dataset': 'Big_Brain',
-                'question': '5'},
-               {'Structure': 'a. carotis interna',
-                'Dataset': 'in_vivo',
-                'question': '6'},
-               {'Structure': 'Globus pallidus externa',
-                'Dataset': 'in_vivo',
-                'question': '7'},
-               {'Structure': 'sinus cavernosus',
-                'Dataset': 'in_vivo',
-                'question': '8'},
-               {'Structure': 'ventriculus quartus',
-                'Dataset': 'ex_vivo',
-                'question': '9'},
-               {'Structure': 'Area tegmentalis ventralis (VTA',
-                'Dataset': 'ex_vivo',
-                'question': '10'}]}
-        if exam_nr >= 241 and exam_nr <= 245:
-            self.structures = structures[exam_nr]
-        else:
-            self.structures = []
+        self.structures = self.getExamBank().get(exam_nr, [])
+        return self.structures
+
+    # Examensbanken läses in första gången den behövs
+    def getExamBank(self):
+        if self.exam_bank is None:
+            if os.path.exists(self.exam_bank_path):
+                self.exam_bank = readExamBank(self.exam_bank_path)
+            else:
+                logging.warning(f"Exam bank {self.exam_bank_path} does not exist")
+                self.exam_bank = {}
+        return self.exam_bank
 
     # Ändrar nuvarande dataset till specificerat dataset
     def changeDataset(self, dataset):
         if dataset.lower()  == BIG_BRAIN.lower():
-            self.displaySelectVolume(BIG_BRAIN_VOLUME_NAME)
+            self.showDataset(BIG_BRAIN)
             self.current_dataset = BIG_BRAIN
+            self.logEvent(EventLog.DATASET_SWITCH, BIG_BRAIN)
         elif dataset.lower() == IN_VIVO.lower():
-            self.displaySelectVolume(IN_VIVO_VOLUME_NAME)
+            self.showDataset(IN_VIVO)
             self.current_dataset = IN_VIVO
+            self.logEvent(EventLog.DATASET_SWITCH, IN_VIVO)
         elif dataset.lower() == EX_VIVO.lower():
-            self.displaySelectVolume(EX_VIVO_VOLUME_NAME)
+            self.showDataset(EX_VIVO)
             self.current_dataset = EX_VIVO
+            self.logEvent(EventLog.DATASET_SWITCH, EX_VIVO)
         else:
             print(f"\nDataset: {dataset} existerar ej\n")
 
@@ -732,6 +961,7 @@ class Example_ProgramLogic(ScriptedLoadableModuleLogic):
         node = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLMarkupsFiducialNode', f"{exam_nr}_{student_name}")
         node.SetLocked(1)
         node.AddNControlPoints(10, "", [0, 0, 0])
+        datasets = [""] * node.GetNumberOfControlPoints()
         for _index, structure in enumerate(structures):
             try:
                 index = int(structure["question"]) - 1
@@ -743,26 +973,124 @@ class Example_ProgramLogic(ScriptedLoadableModuleLogic):
             # Avmarkerar strukturen innan man placerat den.
             # Tar bort koordinater [0, 0, 0] för skapade punkten så att den inte är i vägen.
             node.UnsetNthControlPointPosition(index)
+            datasets[index] = structure["Dataset"]
+        node.SetAttribute(EXAM_NR_ATTRIBUTE, str(exam_nr))
+        node.SetAttribute(STUDENT_NAME_ATTRIBUTE, student_name)
+        node.SetAttribute(DATASETS_ATTRIBUTE, ";".join(datasets))
+        self.addObserver(node, slicer.vtkMRMLMarkupsNode.PointPositionDefinedEvent, self.onControlPointPositionDefined)
         self.node = node
+        if self.multi_dataset_layout:
+            # Den nya noden ska bara visas i det aktiva datasetets vyer
+            node.CreateDefaultDisplayNodes()
+            self.focusDatasetViews(self.current_dataset or BIG_BRAIN)
         return node
 
     # Ändrar till place mode så att en ny control point kan placeras ut
     def setNewControlPoint(self, node, index):
-        # Återställ control point
-        node.SetNthControlPointPosition(index, 0.0, 0.0, 0.0)
-        node.UnsetNthControlPointPosition(index)
+        # Återställ control point. Det gör punkten tillfälligt definierad, vilket inte
+        # ska loggas som en placering.
+        self.resetting_control_point = True
+        try:
+            node.SetNthControlPointPosition(index, 0.0, 0.0, 0.0)
+            node.UnsetNthControlPointPosition(index)
+        finally:
+            self.resetting_control_point = False
         # Placera ut ny control point
         node.SetControlPointPlacementStartIndex(index)
         slicer.modules.markups.logic().StartPlaceMode(1)
         interactionNode = slicer.mrmlScene.GetNodeByID("vtkMRMLInteractionNodeSingleton")
         # Återgå sedan till normalt läge när klar
         interactionNode.SetPlaceModePersistence(0)
+        self.startPlacementRendering(node, interactionNode)
         #interactionNode = slicer.mrmlScene.GetNodeByID("vtkMRMLInteractionNodeSingleton")
         #interactionNode.SwitchToViewTransformMode()
 
         # also turn off place mode persistence if required
         #interactionNode.SetPlaceModePersistence(0)
 
+    # Mäter renderingstiden i alla vyer medan en control point placeras och, om
+    # low_latency_placement är satt, begränsar uppdateringsfrekvensen i vyer som inte
+    # är under muspekaren. Full rendering återställs när punkten är placerad.
+    def startPlacementRendering(self, node, interactionNode):
+        self.stopPlacementRendering()
+        layoutManager = slicer.app.layoutManager()
+        self.placement_views = {}
+        self.placement_view_names = {}
+        self.placement_3d_views = []
+        for sliceViewName in layoutManager.sliceViewNames():
+            view = layoutManager.sliceWidget(sliceViewName).sliceView()
+            self.placement_views[view.mrmlSliceNode().GetID()] = view
+            self.placement_view_names[view.renderWindow()] = sliceViewName
+        for i in range(layoutManager.threeDViewCount):
+            view = layoutManager.threeDWidget(i).threeDView()
+            self.placement_views[view.mrmlViewNode().GetID()] = view
+            self.placement_view_names[view.renderWindow()] = view.mrmlViewNode().GetName()
+            self.placement_3d_views.append(view.mrmlViewNode().GetID())
+        self.placement_update_rates = {viewID: view.maximumUpdateRate for viewID, view in self.placement_views.items()}
+        self.placement_active_views = []
+        self.frame_timer = FrameTimer()
+        for renderWindow in self.placement_view_names:
+            self.addObserver(renderWindow, vtk.vtkCommand.StartEvent, self.onRenderStart)
+            self.addObserver(renderWindow, vtk.vtkCommand.EndEvent, self.onRenderEnd)
+        if self.low_latency_placement:
+            crosshairNode = slicer.mrmlScene.GetFirstNodeByClass("vtkMRMLCrosshairNode")
+            self.addObserver(crosshairNode, slicer.vtkMRMLCrosshairNode.CursorPositionModifiedEvent, self.onPlacementCursorMoved)
+            self.onPlacementCursorMoved(crosshairNode)
+        self.addObserver(node, slicer.vtkMRMLMarkupsNode.PointPositionDefinedEvent, self.onPlacementFinished)
+        self.addObserver(interactionNode, interactionNode.InteractionModeChangedEvent, self.onPlacementInteractionModeChanged)
+
+    def stopPlacementRendering(self):
+        if self.frame_timer is None:
+            return
+        for method in (self.onRenderStart, self.onRenderEnd, self.onPlacementCursorMoved,
+                       self.onPlacementFinished, self.onPlacementInteractionModeChanged):
+            self.removeObservers(method)
+        for viewID, view in self.placement_views.items():
+            view.setMaximumUpdateRate(self.placement_update_rates[viewID])
+            view.scheduleRender()
+        logging.info(f"Rendering during placement: {self.frame_timer.formatSummary()}")
+        self.placement_views = {}
+        self.placement_view_names = {}
+        self.placement_3d_views = []
+        self.placement_update_rates = {}
+        self.placement_active_views = []
+        self.frame_timer = None
+
+    def onRenderStart(self, caller, event):
+        self.frame_timer.startFrame(self.placement_view_names[caller])
+
+    def onRenderEnd(self, caller, event):
+        self.frame_timer.endFrame(self.placement_view_names[caller])
+
+    def onPlacementCursorMoved(self, caller, event=None):
+        ras = [0.0, 0.0, 0.0]
+        xyz = [0.0, 0.0, 0.0]
+        sliceNode = caller.GetCursorPositionXYZ(xyz)
+        if sliceNode is not None:
+            activeViews = [sliceNode.GetID()]
+        elif caller.GetCursorPositionRAS(ras):
+            # Muspekaren är i en 3D-vy
+            activeViews = self.placement_3d_views
+        else:
+            activeViews = list(self.placement_views)
+        if activeViews == self.placement_active_views:
+            return
+        # Renderingsbegäran i begränsade vyer slås ihop tills nästa tillåtna bild
+        self.placement_active_views = activeViews
+        for viewID, view in self.placement_views.items():
+            if viewID in activeViews:
+                view.setMaximumUpdateRate(self.placement_update_rates[viewID])
+            else:
+                view.setMaximumUpdateRate(min(INACTIVE_VIEW_UPDATE_RATE, self.placement_update_rates[viewID]))
+
+    def onPlacementFinished(self, caller, event):
+        self.stopPlacementRendering()
+
+    # Placeringen avbröts, t.ex. med Esc
+    def onPlacementInteractionModeChanged(self, caller, event):
+        if caller.GetCurrentInteractionMode() != caller.Place:
+            self.stopPlacementRendering()
+
     def checkIfControlPointExists(self, question_number):
         # Kan också kolla om den är set eller unset
         return self.answered_questions[question_number - 1]
@@ -770,20 +1098,139 @@ class Example_ProgramLogic(ScriptedLoadableModuleLogic):
     # Centrerar vyerna på control point
     # Hantera på ett bättre sätt i framtiden
     def centreOnControlPoint(self, node, index, dataset):
-        controlPointCoordinates = node.GetNthControlPointPosition(index) # eller GetNthControlPointPositionWorld
-        slicer.modules.markups.logic().JumpSlicesToLocation(controlPointCoordinates[0], controlPointCoordinates[1], controlPointCoordinates[2], True)
+        positions, _states = self.getControlPointArrays(node)
+        controlPointCoordinates = positions[index]
+        self.jumpSlicesToLocation(controlPointCoordinates[0], controlPointCoordinates[1], controlPointCoordinates[2])
+
+    # Hämtar positionerna (i världskoordinater) för alla control points i noden som en
+    # Nx3-array, samt positionsstatus (PositionUndefined, PositionPreview eller
+    # PositionDefined) per punkt. Arrayerna hålls uppdaterade av ett ControlPointWorldIndex
+    # per nod, så transformer räknas bara om när noden eller dess transform ändras.
+    def getControlPointArrays(self, node):
+        return self.getWorldIndex(node).getArrays()
+
+    def getWorldIndex(self, node):
+        worldIndex = self.world_indices.get(node.GetID())
+        if worldIndex is None or worldIndex.node is not node:
+            if worldIndex is not None:
+                worldIndex.release()
+            worldIndex = ControlPointWorldIndex(node)
+            self.world_indices[node.GetID()] = worldIndex
+        return worldIndex
+
+    def releaseWorldIndex(self, node):
+        worldIndex = self.world_indices.pop(node.GetID(), None)
+        if worldIndex is not None:
+            worldIndex.release()
+
+    # Alla examensnoder i scenen, t.ex. för att exportera en hel sals resultat
+    def getExamNodes(self):
+        return [node for node in slicer.util.getNodesByClass("vtkMRMLMarkupsFiducialNode")
+                if node.GetAttribute(EXAM_NR_ATTRIBUTE) is not None]
+
+    # Exporterar control points från flera examensnoder till en komprimerad .npz-fil,
+    # eller .h5 om h5py finns. Positionerna anges i världskoordinater.
+    def exportControlPoints(self, nodes, path):
+        # Tomma arrayer först så att np.concatenate fungerar även utan noder
+        positions = [np.zeros((0, 3))]
+        states = [np.zeros(0, dtype=np.int8)]
+        nodeIndices = [np.zeros(0, dtype=np.int32)]
+        questions = [np.zeros(0, dtype=np.int32)]
+        structures = []
+        datasets = []
+        # Index som bara skapas för exporten tas bort efteråt så att deras observers inte blir kvar
+        createdIndices = [node for node in nodes if node.GetID() not in self.world_indices]
+        for nodeIndex, node in enumerate(nodes):
+            nodePositions, nodeStates = self.getControlPointArrays(node)
+            numberOfControlPoints = len(nodePositions)
+            positions.append(nodePositions)
+            states.append(nodeStates)
+            nodeIndices.append(np.full(numberOfControlPoints, nodeIndex, dtype=np.int32))
+            questions.append(np.arange(1, numberOfControlPoints + 1, dtype=np.int32))
+            labels = vtk.vtkStringArray()
+            node.GetControlPointLabels(labels)
+            structures.extend(labels.GetValue(i) for i in range(labels.GetNumberOfValues()))
+            nodeDatasets = (node.GetAttribute(DATASETS_ATTRIBUTE) or "").split(";")
+            nodeDatasets += [""] * (numberOfControlPoints - len(nodeDatasets))
+            datasets.extend(nodeDatasets[:numberOfControlPoints])
+        for node in createdIndices:
+            self.releaseWorldIndex(node)
+        states = np.concatenate(states)
+        arrays = {
+            "positions": np.concatenate(positions),
+            "position_status": states,
+            "defined": states == slicer.vtkMRMLMarkupsNode.PositionDefined,
+            "node_index": np.concatenate(nodeIndices),
+            "question": np.concatenate(questions),
+            "structure": np.array(structures, dtype=str),
+            "dataset": np.array(datasets, dtype=str),
+            "node_name": np.array([node.GetName() for node in nodes], dtype=str),
+            "exam_nr": np.array([node.GetAttribute(EXAM_NR_ATTRIBUTE) or "" for node in nodes], dtype=str),
+            "student_name": np.array([node.GetAttribute(STUDENT_NAME_ATTRIBUTE) or "" for node in nodes], dtype=str),
+        }
+        if path.endswith(".h5") or path.endswith(".hdf5"):
+            try:
+                import h5py
+            except ImportError:
+                raise ImportError("h5py is required to export to HDF5, use a .npz file instead")
+            with h5py.File(path, "w") as h5File:
+                for name, array in arrays.items():
+                    if array.dtype.kind == "U":
+                        h5File.create_dataset(name, data=array.astype(object), dtype=h5py.string_dtype())
+                    else:
+                        h5File.create_dataset(name, data=array, compression="gzip")
+        else:
+            np.savez_compressed(path, **arrays)
+        logging.info(f"Exported {len(arrays['positions'])} control points from {len(nodes)} nodes to {path}")
+        return arrays
+
+    # Filerna som ska vara identiska på alla stationer: volymerna för Big_Brain, in_vivo
+    # och ex_vivo samt nedladdade filer från registerSampleData
+    def getDatasetFiles(self):
+        files = {}
+        for dataset, volumeID in DATASET_VOLUME_IDS.items():
+            volumeNode = slicer.mrmlScene.GetNodeByID(volumeID)
+            storageNode = volumeNode.GetStorageNode() if volumeNode else None
+            if storageNode is None or not storageNode.GetFileName():
+                logging.warning(f"No file found for dataset {dataset}")
+                continue
+            files[dataset] = storageNode.GetFileName()
+            for i in range(storageNode.GetNumberOfFileNames()):
+                fileName = storageNode.GetNthFileName(i)
+                if fileName != storageNode.GetFileName():
+                    files[f"{dataset}/{os.path.basename(fileName)}"] = fileName
+        for fileName in SAMPLE_DATA_CHECKSUMS:
+            path = os.path.join(slicer.app.cachePath, fileName)
+            if os.path.exists(path):
+                files[fileName] = path
+        return files
+
+    # Beräknar SHA256 för alla datasetfiler och skriver ett manifest som kan jämföras
+    # mellan stationer med Example_ProgramLib/IntegrityAudit.py compare. Med useCache=False
+    # läses alla filer om, vilket behövs för att upptäcka fel på disken som inte ändrar
+    # filens storlek eller ändringstid.
+    def auditDatasetIntegrity(self, manifestPath, useCache=True):
+        files = self.getDatasetFiles()
+        expectedChecksums = {name: checksum for name, checksum in SAMPLE_DATA_CHECKSUMS.items() if name in files}
+        cachePath = os.path.join(slicer.app.temporaryPath, INTEGRITY_CACHE_FILE_NAME)
+        manifest = IntegrityAudit.auditFiles(files, cachePath=cachePath, expectedChecksums=expectedChecksums, useCache=useCache)
+        IntegrityAudit.writeManifest(manifest, manifestPath)
+        failed = [name for name, entry in manifest["files"].items() if not entry["ok"]]
+        logging.info(f"Audited {len(files)} files in {manifest['seconds']} s, {len(failed)} failed")
+        for name in failed:
+            logging.error(f"Integrity check failed for {name}: {manifest['files'][name].get('error', 'checksum mismatch')}")
+        return manifest
 
     def resetAnsweredQuestions(self):
         self.answered_questions = [False] * NUMBER_OF_QUESTIONS
 
     def updateAnsweredQuestions(self):
         self.resetAnsweredQuestions() # behövs detta?
-        for i in range(self.node.GetNumberOfControlPoints()):
-            controlPointCoordinates = self.node.GetNthControlPointPosition(i)
-            # Kan också kolla om den är set eller unset
-            if controlPointCoordinates[0] != 0.0 or controlPointCoordinates[1] != 0.0 or controlPointCoordinates[2] != 0.0:
-                # Om koordinater för control point ej är [0.0, 0.0, 0.0] är frågan besvarad
-                self.answered_questions[i] = True
+        _positions, states = self.getControlPointArrays(self.node)
+        # En fråga är besvarad när dess control point har placerats ut (position satt).
+        # Koordinaterna kan inte jämföras med [0, 0, 0] eftersom de är i världskoordinater.
+        for i, state in enumerate(states[:NUMBER_OF_QUESTIONS]):
+            self.answered_questions[i] = bool(state == slicer.vtkMRMLMarkupsNode.PositionDefined)
 
 
 #
@@ -806,6 +1253,20 @@ class Example_ProgramTest(ScriptedLoadableModuleTest):
         """Run as few or as many tests as needed here."""
         self.setUp()
         self.test_Example_Program1()
+        self.setUp()
+        self.test_ResultsCollector()
+        self.setUp()
+        self.test_ResultsAnalytics()
+        self.setUp()
+        self.test_EventLog()
+        self.setUp()
+        self.test_ControlPointWorldIndex()
+        self.setUp()
+        self.test_FrameTimer()
+        self.setUp()
+        self.test_ExamGenerator()
+        self.setUp()
+        self.test_IntegrityAudit()
 
     def test_Example_Program1(self):
         """Ideally you should have several levels of tests.  At the lowest level
@@ -853,3 +1314,431 @@ class Example_ProgramTest(ScriptedLoadableModuleTest):
         self.assertEqual(outputScalarRange[1], inputScalarRange[1])
 
         self.delayDisplay("Test passed")
+
+    def test_ResultsCollector(self):
+        """Send results through a ResultsClient to a collector running on localhost."""
+
+        import asyncio
+        import json
+        import tempfile
+        import threading
+
+        from Example_ProgramLib.ResultsCollector import ResultsCollector
+
+        self.delayDisplay("Starting the results collector test")
+
+        tempDirectory = tempfile.mkdtemp()
+        storePath = os.path.join(tempDirectory, "results.jsonl")
+        loop = asyncio.new_event_loop()
+        collector = ResultsCollector(storePath, maxQueueSize=4, maxBatchSize=3)
+        loop.run_until_complete(collector.start("127.0.0.1", 0))
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+
+        client = ResultsClient("127.0.0.1", collector.port, os.path.join(tempDirectory, "spool"), retryInterval=0.1)
+        startTime = time.perf_counter()
+        for i in range(20):
+            client.submit({"student_name": "Test Student", "exam_nr": i})
+        self.assertTrue(client.waitUntilSent(timeout=10))
+        # En ensam station ska inte vänta på att en batch fylls, annars tar varje resultat flushInterval
+        self.assertLess(time.perf_counter() - startTime, 20 * collector.flushInterval / 2)
+        client.close()
+
+        # Ett resultat som skickas igen (t.ex. efter timeout) kvitteras men skrivs inte två gånger
+        with socket.create_connection(("127.0.0.1", collector.port), timeout=5) as connection:
+            connectionFile = connection.makefile("rb")
+            for _i in range(2):
+                connection.sendall(json.dumps({"submission_id": "resent", "exam_nr": 20}).encode("utf-8") + b"\n")
+                self.assertEqual(connectionFile.readline(), b"OK\n")
+            connectionFile.close()
+        asyncio.run_coroutine_threadsafe(collector.stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+        with open(storePath, encoding="utf-8") as storeFile:
+            examNumbers = [json.loads(line)["exam_nr"] for line in storeFile]
+        self.assertEqual(examNumbers, list(range(21)))
+        self.assertEqual(collector.duplicatesDropped, 1)
+        self.assertEqual(os.listdir(os.path.join(tempDirectory, "spool")), [])
+
+        self.delayDisplay("Test passed")
+
+    def test_ResultsAnalytics(self):
+        """Summarize a small set of results and save and load the table."""
+
+        import tempfile
+
+        import numpy as np
+
+        from Example_ProgramLib.ResultsAnalytics import ResultsTable, summarize
+
+        self.delayDisplay("Starting the results analytics test")
+
+        def question(number, structure, dataset, position):
+            return {"question": number, "Structure": structure, "Dataset": dataset,
+                    "answered": position is not None, "position": position or [0.0, 0.0, 0.0]}
+
+        results = [
+            {"student_name": "A", "exam_nr": "241", "submission_id": "1", "questions": [
+                question(1, "Flocculus", "ex_vivo", [1.0, 0.0, 10.0]),
+                question(2, "Thalamus", "ex_vivo", None)]},
+            {"student_name": "B", "exam_nr": "241", "submission_id": "2", "questions": [
+                question(1, "Flocculus", "ex_vivo", [3.0, 0.0, 10.0]),
+                question(2, "Thalamus", "ex_vivo", [5.0, 5.0, 5.0])]},
+            {"student_name": "C", "exam_nr": "242", "submission_id": "3", "questions": [
+                question(1, "Flocculus", "ex_vivo", None),
+                question(2, "Thalamus", "in_vivo", None)]},
+            # Samma inskickning två gånger räknas bara en gång
+            {"student_name": "C", "exam_nr": "242", "submission_id": "3", "questions": [
+                question(1, "Flocculus", "ex_vivo", None),
+                question(2, "Thalamus", "in_vivo", None)]},
+        ]
+        table = ResultsTable.fromResults(results)
+        self.assertEqual(len(table), 6)
+
+        summary = summarize(table, by=("Structure", "Dataset"))
+        rows = {(structure, dataset): i for i, (structure, dataset) in enumerate(zip(summary["Structure"], summary["Dataset"]))}
+        self.assertEqual(len(rows), 3)
+        flocculus = rows[("Flocculus", "ex_vivo")]
+        self.assertEqual(summary["count"][flocculus], 3)
+        self.assertEqual(summary["missed"][flocculus], 1)
+        self.assertAlmostEqual(summary["miss_rate"][flocculus], 1.0 / 3.0)
+        self.assertAlmostEqual(summary["mean_x"][flocculus], 2.0)
+        self.assertAlmostEqual(summary["std_x"][flocculus], 1.0)
+        self.assertAlmostEqual(summary["std_z"][flocculus], 0.0)
+        thalamus = rows[("Thalamus", "ex_vivo")]
+        self.assertEqual(summary["missed"][thalamus], 1)
+        self.assertAlmostEqual(summary["std_x"][thalamus], 0.0)
+        self.assertEqual(summary["missed"][rows[("Thalamus", "in_vivo")]], 1)
+        self.assertTrue(np.isnan(summary["mean_x"][rows[("Thalamus", "in_vivo")]]))
+
+        path = os.path.join(tempfile.mkdtemp(), "results.npz")
+        table.save(path)
+        loaded = ResultsTable.load(path)
+        for name in ("student_name", "exam_nr", "Structure", "Dataset", "question", "answered", "x", "y", "z"):
+            np.testing.assert_array_equal(loaded.column(name), table.column(name))
+        loadedSummary = summarize(ResultsTable.concatenate([table, loaded]))
+        self.assertEqual(loadedSummary["count"].sum(), 12)
+
+        self.delayDisplay("Test passed")
+
+    def test_EventLog(self):
+        """Write, read and replay event logs, including logs with a partly written record."""
+
+        import tempfile
+
+        from Example_ProgramLib import EventLog
+
+        self.delayDisplay("Starting the event log test")
+
+        tempDirectory = tempfile.mkdtemp()
+
+        # Alla händelsetyper kan skrivas och läsas tillbaka
+        path = os.path.join(tempDirectory, "roundtrip.bv4log")
+        writer = EventLog.EventLogWriter(path)
+        writer.write(EventLog.LOAD, "Åsa Öberg", "241")
+        writer.write(EventLog.STRUCTURE_CLICK, 3)
+        writer.write(EventLog.PLACE_CLICK, 3)
+        writer.write(EventLog.DATASET_SWITCH, IN_VIVO)
+        writer.write(EventLog.POINT_PLACED, 2, 1.5, -2.0, 3.25)
+        writer.write(EventLog.SAVE)
+        writer.close()
+        events = list(EventLog.readEventLog(path))
+        self.assertEqual([event.type for event in events],
+                         [EventLog.SESSION, EventLog.LOAD, EventLog.STRUCTURE_CLICK, EventLog.PLACE_CLICK,
+                          EventLog.DATASET_SWITCH, EventLog.POINT_PLACED, EventLog.SAVE])
+        self.assertEqual(events[1].fields, ("Åsa Öberg", "241"))
+        self.assertEqual(events[4].fields, (IN_VIVO,))
+        self.assertEqual(events[5].fields, (2, 1.5, -2.0, 3.25))
+        times = [event.time for event in events]
+        self.assertEqual(times, sorted(times))
+
+        # En ofullständig sista post ignoreras
+        with open(path, "rb") as logFile:
+            data = logFile.read()
+        truncatedPath = os.path.join(tempDirectory, "truncated.bv4log")
+        with open(truncatedPath, "wb") as logFile:
+            logFile.write(data[:-20])
+        self.assertEqual([event.type for event in EventLog.readEventLog(truncatedPath)],
+                         [event.type for event in events[:5]])
+
+        # En ny session efter en ofullständig post läses korrekt
+        writer = EventLog.EventLogWriter(truncatedPath)
+        writer.write(EventLog.LOAD, "Bo Ek", "242")
+        writer.write(EventLog.STRUCTURE_CLICK, 1)
+        writer.close()
+        sessions = EventLog.splitSessions(EventLog.readEventLog(truncatedPath))
+        self.assertEqual(len(sessions), 2)
+        self.assertEqual(len(sessions[0]), 5)
+        self.assertEqual([event.type for event in sessions[1]], [EventLog.SESSION, EventLog.LOAD, EventLog.STRUCTURE_CLICK])
+        self.assertEqual(sessions[1][1].fields, ("Bo Ek", "242"))
+
+        # Uppspelning anropar en hanterare per händelse i ordning
+        replayed = []
+        handlers = {
+            EventLog.LOAD: lambda name, examNr: replayed.append(("load", name, examNr)),
+            EventLog.STRUCTURE_CLICK: lambda number: replayed.append(("structure", number)),
+        }
+        timings = EventLog.EventReplayer(handlers).replay(sessions[1])
+        self.assertEqual(replayed, [("load", "Bo Ek", "242"), ("structure", 1)])
+        self.assertEqual(len(timings), 2)
+
+        self.delayDisplay("Test passed")
+
+    def test_ControlPointWorldIndex(self):
+        """Control point arrays follow placed, moved, added and removed points and the parent transform."""
+
+        import tempfile
+
+        self.delayDisplay("Starting the control point world index test")
+
+        logic = Example_ProgramLogic()
+        node = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode")
+        node.AddNControlPoints(3, "", [0, 0, 0])
+        node.UnsetNthControlPointPosition(1)
+        transformNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode")
+        matrix = vtk.vtkMatrix4x4()
+        matrix.SetElement(0, 3, 10.0)
+        matrix.SetElement(1, 3, -5.0)
+        transformNode.SetMatrixTransformToParent(matrix)
+        node.SetAndObserveTransformNodeID(transformNode.GetID())
+
+        def assertArraysMatchNode():
+            positions, states = logic.getControlPointArrays(node)
+            self.assertEqual(len(positions), node.GetNumberOfControlPoints())
+            self.assertEqual(len(states), node.GetNumberOfControlPoints())
+            position = [0.0, 0.0, 0.0]
+            for index in range(node.GetNumberOfControlPoints()):
+                self.assertEqual(states[index], node.GetNthControlPointPositionStatus(index))
+                if states[index] == slicer.vtkMRMLMarkupsNode.PositionDefined:
+                    node.GetNthControlPointPositionWorld(index, position)
+                    np.testing.assert_allclose(positions[index], position)
+
+        assertArraysMatchNode()
+
+        # Placering av en punkt
+        node.SetNthControlPointPosition(1, 1.0, 2.0, 3.0)
+        assertArraysMatchNode()
+        np.testing.assert_allclose(logic.getControlPointArrays(node)[0][1], [11.0, -3.0, 3.0])
+
+        # Ändrad transform
+        matrix.SetElement(2, 3, 7.0)
+        transformNode.SetMatrixTransformToParent(matrix)
+        assertArraysMatchNode()
+        np.testing.assert_allclose(logic.getControlPointArrays(node)[0][1], [11.0, -3.0, 10.0])
+
+        # Tillagda och borttagna punkter
+        node.AddControlPoint(vtk.vtkVector3d(4.0, 5.0, 6.0))
+        assertArraysMatchNode()
+        node.RemoveNthControlPoint(0)
+        assertArraysMatchNode()
+        np.testing.assert_allclose(logic.getControlPointArrays(node)[0][0], [11.0, -3.0, 10.0])
+
+        # Export använder samma index och lämnar inga nya index kvar
+        otherNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode")
+        otherNode.AddControlPoint(vtk.vtkVector3d(1.0, 1.0, 1.0), "other")
+        path = os.path.join(tempfile.mkdtemp(), "control_points.npz")
+        logic.exportControlPoints([node, otherNode], path)
+        self.assertIn(node.GetID(), logic.world_indices)
+        self.assertNotIn(otherNode.GetID(), logic.world_indices)
+        with np.load(path) as exported:
+            self.assertEqual(len(exported["positions"]), node.GetNumberOfControlPoints() + 1)
+            np.testing.assert_allclose(exported["positions"][-1], [1.0, 1.0, 1.0])
+            self.assertEqual(exported["structure"][-1], "other")
+
+        logic.releaseWorldIndex(node)
+        self.assertEqual(logic.world_indices, {})
+
+        self.delayDisplay("Test passed")
+
+    def test_FrameTimer(self):
+        """Frame time statistics with a clock that is advanced by the test."""
+
+        from Example_ProgramLib.FrameTimer import FrameTimer
+
+        self.delayDisplay("Starting the frame timer test")
+
+        now = [100.0]
+        frameTimer = FrameTimer(clock=lambda: now[0])
+
+        def renderFrame(view, seconds):
+            frameTimer.startFrame(view)
+            now[0] += seconds
+            frameTimer.endFrame(view)
+
+        renderFrame("Red", 0.010)
+        renderFrame("Red", 0.030)
+        renderFrame("Yellow", 0.005)
+
+        # Ett EndEvent utan StartEvent (t.ex. om observern lades till mitt i en rendering) räknas inte
+        now[0] += 0.5
+        frameTimer.endFrame("Green")
+        frameTimer.endFrame("Red")
+
+        # En påbörjad rendering räknas inte förrän den är klar
+        frameTimer.startFrame("Green")
+        now[0] += 0.455
+
+        summary = frameTimer.summary()
+        self.assertEqual(sorted(summary), ["Red", "Yellow"])
+        self.assertEqual(summary["Red"]["frames"], 2)
+        self.assertAlmostEqual(summary["Red"]["mean_ms"], 20.0)
+        self.assertAlmostEqual(summary["Red"]["max_ms"], 30.0)
+        self.assertAlmostEqual(summary["Red"]["total_ms"], 40.0)
+        self.assertEqual(summary["Yellow"]["frames"], 1)
+        self.assertAlmostEqual(summary["Yellow"]["mean_ms"], 5.0)
+
+        self.assertEqual(frameTimer.formatSummary().splitlines(), [
+            "3 frames, 45.0 ms rendering in 1.00 s",
+            "  Red: 2 frames, mean 20.0 ms, max 30.0 ms",
+            "  Yellow: 1 frames, mean 5.0 ms, max 5.0 ms",
+        ])
+
+        self.delayDisplay("Test passed")
+
+    def test_ExamGenerator(self):
+        """Generated exams satisfy the constraints, are reproducible and can be loaded by the logic."""
+
+        import tempfile
+
+        from Example_ProgramLib.ExamGenerator import ExamGenerator, poolFromExamBank, readExamBank, writeExamBank
+
+        self.delayDisplay("Starting the exam generator test")
+
+        questionsPerDataset = {BIG_BRAIN: 3, IN_VIVO: 4, EX_VIVO: 3}
+        pool = [{"Structure": f"{dataset} structure {i}", "Dataset": dataset, "difficulty": (i % 4) / 4.0}
+                for dataset in questionsPerDataset for i in range(8)]
+        # Samma struktur i två dataset, med olika skiftläge
+        pool.append({"Structure": f"{BIG_BRAIN} STRUCTURE 0", "Dataset": IN_VIVO, "difficulty": 0.0})
+        tolerance = 0.25
+        generator = ExamGenerator(pool, questionsPerDataset, difficultyTolerance=tolerance)
+
+        examBank = generator.generate(1000, seed=2026)
+        self.assertEqual(sorted(examBank), list(range(1000, 2000)))
+        self.assertEqual(generator.generate(1000, seed=2026), examBank)
+        self.assertEqual(generator.generate(10, seed=2026), {examNumber: examBank[examNumber] for examNumber in range(1000, 1010)})
+        self.assertNotEqual(generator.generate(10, seed=2027), generator.generate(10, seed=2026))
+
+        difficulties = {(item["Structure"], item["Dataset"]): item["difficulty"] for item in pool}
+        averageDifficulty = {dataset: sum(item["difficulty"] for item in pool if item["Dataset"] == dataset) /
+                             len([item for item in pool if item["Dataset"] == dataset]) for dataset in questionsPerDataset}
+        targetDifficulty = sum(count * averageDifficulty[dataset] for dataset, count in questionsPerDataset.items())
+        exams = set()
+        for questions in examBank.values():
+            self.assertEqual([question["question"] for question in questions], [str(i + 1) for i in range(10)])
+            datasets = [question["Dataset"] for question in questions]
+            self.assertEqual(datasets, [dataset for dataset, count in questionsPerDataset.items() for _i in range(count)])
+            structureNames = [question["Structure"].lower() for question in questions]
+            self.assertEqual(len(set(structureNames)), len(structureNames))
+            totalDifficulty = sum(difficulties[(question["Structure"], question["Dataset"])] for question in questions)
+            self.assertLessEqual(abs(totalDifficulty - targetDifficulty), tolerance + 1e-9)
+            exams.add(frozenset((question["Structure"], question["Dataset"]) for question in questions))
+        self.assertEqual(len(exams), len(examBank))
+
+        # För få strukturer, och för få unika examina
+        with self.assertRaises(ValueError):
+            ExamGenerator(pool, {BIG_BRAIN: 9, IN_VIVO: 1})
+        with self.assertRaises(ValueError):
+            ExamGenerator(pool[:3] + pool[8:12], {BIG_BRAIN: 3, IN_VIVO: 4}, maxAttempts=100).generate(2, seed=1)
+
+        # Banken kan sparas, läsas in igen och användas av modulen
+        path = os.path.join(tempfile.mkdtemp(), "ExamBank.json")
+        writeExamBank(examBank, path)
+        self.assertEqual(readExamBank(path), examBank)
+        logic = Example_ProgramLogic()
+        logic.exam_bank_path = path
+        self.assertEqual(logic.retrieveStructures(1500), examBank[1500])
+        self.assertEqual(logic.retrieveStructures(241), [])
+
+        # Modulens egen examensbank innehåller de handskrivna examina och kan användas som pool
+        moduleExamBank = readExamBank(EXAM_BANK_PATH)
+        self.assertEqual(sorted(moduleExamBank)[:5], [241, 242, 243, 244, 245])
+        self.assertEqual(len(Example_ProgramLogic().retrieveStructures(241)), NUMBER_OF_QUESTIONS)
+        moduleGenerator = ExamGenerator(poolFromExamBank(moduleExamBank))
+        self.assertEqual(len(moduleGenerator.generate(10, seed=1)), 10)
+
+        self.delayDisplay("Test passed")
+
+    def test_IntegrityAudit(self):
+        """Hash files with and without the digest cache and compare manifests."""
+
+        import hashlib
+        import tempfile
+        from unittest import mock
+
+        self.delayDisplay("Starting the integrity audit test")
+
+        tempDirectory = tempfile.mkdtemp()
+        cachePath = os.path.join(tempDirectory, "audit_cache.json")
+        pathA = os.path.join(tempDirectory, "a.nrrd")
+        pathB = os.path.join(tempDirectory, "b.nrrd")
+        with open(pathA, "wb") as dataFile:
+            dataFile.write(b"a" * 1000)
+        with open(pathB, "wb") as dataFile:
+            dataFile.write(b"")
+        files = {"A": pathA, "B": pathB}
+        digestA = hashlib.sha256(b"a" * 1000).hexdigest()
+
+        def audit(**kwargs):
+            with mock.patch.object(IntegrityAudit, "sha256OfFile", wraps=IntegrityAudit.sha256OfFile) as sha256OfFile:
+                manifest = IntegrityAudit.auditFiles(files, cachePath=cachePath, **kwargs)
+            return manifest, sha256OfFile.call_count
+
+        manifest, hashed = audit()
+        self.assertEqual(hashed, 2)
+        self.assertEqual(manifest["files"]["A"]["sha256"], digestA)
+        self.assertEqual(manifest["files"]["B"]["sha256"], hashlib.sha256(b"").hexdigest())
+        self.assertTrue(all(entry["ok"] and not entry["cached"] for entry in manifest["files"].values()))
+
+        # Andra granskningen läser inte om filerna
+        manifest, hashed = audit()
+        self.assertEqual(hashed, 0)
+        self.assertTrue(all(entry["cached"] for entry in manifest["files"].values()))
+        self.assertEqual(manifest["files"]["A"]["sha256"], digestA)
+
+        # Utan cache läses alla filer om
+        manifest, hashed = audit(useCache=False)
+        self.assertEqual(hashed, 2)
+        self.assertFalse(any(entry["cached"] for entry in manifest["files"].values()))
+
+        # Ändrad storlek eller ändringstid gör cachen ogiltig för filen
+        with open(pathA, "ab") as dataFile:
+            dataFile.write(b"a")
+        manifest, hashed = audit()
+        self.assertEqual(hashed, 1)
+        self.assertFalse(manifest["files"]["A"]["cached"])
+        self.assertEqual(manifest["files"]["A"]["sha256"], hashlib.sha256(b"a" * 1001).hexdigest())
+        stat = os.stat(pathB)
+        os.utime(pathB, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        manifest, hashed = audit()
+        self.assertEqual(hashed, 1)
+        self.assertFalse(manifest["files"]["B"]["cached"])
+        self.assertTrue(manifest["files"]["A"]["cached"])
+
+        # Förväntade checksummor
+        manifest, _hashed = audit(expectedChecksums={"A": "SHA256:" + "0" * 64, "B": hashlib.sha256(b"").hexdigest().upper()})
+        self.assertFalse(manifest["files"]["A"]["ok"])
+        self.assertTrue(manifest["files"]["B"]["ok"])
+
+        # Kataloger och saknade filer får ett felmeddelande
+        manifest = IntegrityAudit.auditFiles({"A": pathA, "Directory": tempDirectory,
+                                              "Missing": os.path.join(tempDirectory, "missing.nrrd")})
+        self.assertTrue(manifest["files"]["A"]["ok"])
+        for name in ("Directory", "Missing"):
+            self.assertFalse(manifest["files"][name]["ok"])
+            self.assertIn("error", manifest["files"][name])
+            self.assertNotIn("sha256", manifest["files"][name])
+
+        # Jämförelse mellan stationer
+        reference = dict(IntegrityAudit.auditFiles(files), station="station01")
+        self.assertEqual(IntegrityAudit.compareManifests(reference, dict(reference, station="station02")), [])
+        with open(pathA, "wb") as dataFile:
+            dataFile.write(b"b" * 1001)
+        other = dict(IntegrityAudit.auditFiles({"A": pathA, "C": pathB}), station="station02")
+        differences = IntegrityAudit.compareManifests(reference, other)
+        self.assertEqual(len(differences), 3)
+        self.assertTrue(differences[0].startswith("A: ") and differences[0].endswith(" on station02"))
+        self.assertEqual(differences[1:], ["B: missing on station02", "C: only on station02"])
+        failed = dict(reference, station="station03", files=dict(reference["files"], B={"path": pathB, "error": "", "ok": False}))
+        self.assertIn("B: failed verification on station03", IntegrityAudit.compareManifests(reference, failed))
+        self.assertIn("B: failed verification on station03", IntegrityAudit.compareManifests(failed, reference))
+
+        self.delayDisplay("Test passed")
@@ -0,0 +1,225 @@
+"""
+Compact, append-only binary log of exam actions and a replay engine for it.
+
+The file starts with MAGIC and then holds one record per event:
+
+    uint8 event type | uint64 nanoseconds since session start | uint16 payload size | payload
+
+All numbers are little endian. The payload fields of each event type are listed in
+EVENT_FIELDS: "B" is an uint8, "d" a float64 and "s" an UTF-8 string prefixed by its
+uint16 size. Every session starts with a SESSION event holding the wall-clock time, so
+several sessions can be appended to the same file. Each record is written and flushed
+with a single write, so the log is intact up to the last event if the program freezes.
+A record that was only partly written is cut off before a new session is appended, and
+the reader stops at the first record that cannot be decoded.
+"""
+
+import collections
+import struct
+import time
+
+MAGIC = b"BV4LOG1\n"
+
+SESSION = 0
+LOAD = 1
+STRUCTURE_CLICK = 2
+PLACE_CLICK = 3
+DATASET_SWITCH = 4
+POINT_PLACED = 5
+SAVE = 6
+
+EVENT_NAMES = {
+    SESSION: "session",
+    LOAD: "load",
+    STRUCTURE_CLICK: "structure_click",
+    PLACE_CLICK: "place_click",
+    DATASET_SWITCH: "dataset_switch",
+    POINT_PLACED: "point_placed",
+    SAVE: "save",
+}
+
+EVENT_FIELDS = {
+    SESSION: "d",       # wall-clock time
+    LOAD: "ss",         # student name, exam number
+    STRUCTURE_CLICK: "B",
+    PLACE_CLICK: "B",
+    DATASET_SWITCH: "s",
+    POINT_PLACED: "Bddd",  # control point index, position
+    SAVE: "",
+}
+
+RECORD_HEADER = struct.Struct("<BQH")
+STRING_SIZE = struct.Struct("<H")
+
+Event = collections.namedtuple("Event", ["type", "time", "fields"])
+
+
+def encodeFields(eventType, fields) -> bytes:
+    formats = EVENT_FIELDS[eventType]
+    if len(formats) != len(fields):
+        raise ValueError(f"{EVENT_NAMES[eventType]} event takes {len(formats)} fields, got {len(fields)}")
+    parts = []
+    for fieldFormat, value in zip(formats, fields):
+        if fieldFormat == "s":
+            data = str(value).encode("utf-8")
+            parts.append(STRING_SIZE.pack(len(data)))
+            parts.append(data)
+        else:
+            parts.append(struct.pack("<" + fieldFormat, value))
+    return b"".join(parts)
+
+
+def decodeFields(eventType, payload) -> tuple:
+    fields = []
+    offset = 0
+    for fieldFormat in EVENT_FIELDS[eventType]:
+        if fieldFormat == "s":
+            (size,) = STRING_SIZE.unpack_from(payload, offset)
+            offset += STRING_SIZE.size
+            fields.append(payload[offset:offset + size].decode("utf-8"))
+            offset += size
+        else:
+            (value,) = struct.unpack_from("<" + fieldFormat, payload, offset)
+            offset += struct.calcsize("<" + fieldFormat)
+            fields.append(value)
+    return tuple(fields)
+
+
+#
+# EventLogWriter
+#
+
+
+class EventLogWriter:
+    """Appends events to a log file. Timestamps are taken from a monotonic clock."""
+
+    def __init__(self, path, clock=time.monotonic_ns) -> None:
+        self.path = path
+        self.clock = clock
+        self._file = open(path, "ab", buffering=0)
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        else:
+            # Skär bort en ofullständig sista post (t.ex. efter att programmet frös) så
+            # att den nya sessionens poster inte läses som en del av den
+            validLength = validEventLogLength(path)
+            if validLength < self._file.tell():
+                self._file.truncate(validLength)
+                self._file.seek(validLength)
+        self._sessionStart = self.clock()
+        self.write(SESSION, time.time())
+
+    def write(self, eventType, *fields) -> None:
+        payload = encodeFields(eventType, fields)
+        elapsed = self.clock() - self._sessionStart
+        self._file.write(RECORD_HEADER.pack(eventType, elapsed, len(payload)) + payload)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _readRecords(logFile):
+    """Yield (event, end offset) for each complete and decodable record after MAGIC."""
+    while True:
+        header = logFile.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return
+        eventType, elapsed, size = RECORD_HEADER.unpack(header)
+        if eventType not in EVENT_FIELDS:
+            return
+        payload = logFile.read(size)
+        if len(payload) < size:
+            return
+        try:
+            fields = decodeFields(eventType, payload)
+        except (struct.error, UnicodeDecodeError):
+            return
+        yield Event(eventType, elapsed / 1e9, fields), logFile.tell()
+
+
+def readEventLog(path):
+    """Yield the events of a log file. Reading stops at a truncated or corrupt record."""
+    with open(path, "rb") as logFile:
+        if logFile.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an event log")
+        for event, _end in _readRecords(logFile):
+            yield event
+
+
+def validEventLogLength(path) -> int:
+    """Length in bytes of the part of a log file that holds complete records."""
+    with open(path, "rb") as logFile:
+        if logFile.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an event log")
+        length = len(MAGIC)
+        for _event, end in _readRecords(logFile):
+            length = end
+        return length
+
+
+def splitSessions(events) -> list:
+    """Split the events of a log file into one list per session."""
+    sessions = []
+    for event in events:
+        if event.type == SESSION or not sessions:
+            sessions.append([])
+        sessions[-1].append(event)
+    return sessions
+
+
+#
+# EventReplayer
+#
+
+
+class EventReplayer:
+    """Replays logged events by calling a handler per event type.
+
+    :param handlers: dictionary from event type to a callable taking the event fields.
+      Event types without a handler are skipped.
+    :param realTime: if True, wait between events as long as in the original session
+      (divided by speed), otherwise replay as fast as possible
+    :param wait: callable taking a number of seconds, used between events in real-time mode.
+      Inside Slicer this should keep processing Qt events.
+    """
+
+    def __init__(self, handlers, realTime=False, speed=1.0, wait=time.sleep, clock=time.perf_counter) -> None:
+        self.handlers = handlers
+        self.realTime = realTime
+        self.speed = speed
+        self.wait = wait
+        self.clock = clock
+
+    def replay(self, events) -> list:
+        """Replay events in order and return (event, seconds spent in its handler) for each replayed event."""
+        timings = []
+        replayStart = self.clock()
+        sessionOffset = 0.0
+        for event in events:
+            if event.type == SESSION:
+                # Tidsstämplar börjar om från noll i varje session
+                sessionOffset = self.clock() - replayStart
+                continue
+            handler = self.handlers.get(event.type)
+            if handler is None:
+                continue
+            if self.realTime:
+                delay = sessionOffset + event.time / self.speed - (self.clock() - replayStart)
+                if delay > 0:
+                    self.wait(delay)
+            start = self.clock()
+            handler(*event.fields)
+            timings.append((event, self.clock() - start))
+        return timings
+
+
+def summarizeTimings(timings) -> str:
+    """Format the handler times returned by EventReplayer.replay() per event type."""
+    byType = collections.defaultdict(list)
+    for event, duration in timings:
+        byType[event.type].append(duration)
+    lines = []
+    for eventType, durations in sorted(byType.items()):
+        lines.append(f"  {EVENT_NAMES[eventType]}: {len(durations)} events, "
+                     f"mean {1000.0 * sum(durations) / len(durations):.1f} ms, max {1000.0 * max(durations):.1f} ms")
+    return "\n".join(lines)
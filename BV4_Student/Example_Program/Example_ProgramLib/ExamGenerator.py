@@ -0,0 +1,203 @@
+"""
+Generator for randomized exams in the exam-bank format used by Example_ProgramLogic.retrieveStructures.
+
+An exam bank maps an exam number to a list of questions:
+    {1000: [{"Structure": "Thalamus", "Dataset": "ex_vivo", "question": "1"}, ...], ...}
+
+Exams are drawn from a pool of structures with a fixed number of questions per dataset,
+without duplicate structures and, when the pool has difficulties, with the total difficulty
+within a tolerance of the pool average. Every exam in a bank is unique. Each attempt at an
+exam draws from its own random generator seeded by the seed, the exam number and the attempt
+number, so the same seed always reproduces the same exams, and an exam only changes when it
+would duplicate an earlier exam, not when the count or the exams before it change.
+
+The module's own exam bank, Resources/ExamBank.json, can be used both as the pool and, with
+--append, as the output, so that the generated exams are added after the existing ones.
+
+Examples:
+    python ExamGenerator.py pool.json --count 20000 --seed 2026 --per-dataset Big_Brain=3 in_vivo=4 ex_vivo=3 \\
+        --difficulty summary.csv --output ExamBank.json
+    python ExamGenerator.py ../Resources/ExamBank.json --count 1000 --seed 2026 --append --output ../Resources/ExamBank.json
+"""
+
+import argparse
+import csv
+import json
+import random
+
+NUMBER_OF_QUESTIONS = 10
+DEFAULT_QUESTIONS_PER_DATASET = {"Big_Brain": 3, "in_vivo": 4, "ex_vivo": 3}
+DEFAULT_FIRST_EXAM_NUMBER = 1000
+
+
+def poolFromExamBank(examBank) -> list:
+    """Collect the unique (Structure, Dataset) pairs of an existing exam bank as a pool."""
+    pool = {}
+    for questions in examBank.values():
+        for question in questions:
+            key = (question["Structure"], question["Dataset"])
+            pool.setdefault(key, {"Structure": question["Structure"], "Dataset": question["Dataset"]})
+    return list(pool.values())
+
+
+def applyDifficulties(pool, summaryCsvPath, column="miss_rate") -> list:
+    """Set the difficulty of each structure from a summary written by ResultsAnalytics.writeSummaryCsv."""
+    difficulties = {}
+    with open(summaryCsvPath, newline="", encoding="utf-8") as csvFile:
+        for row in csv.DictReader(csvFile):
+            difficulties[(row["Structure"], row["Dataset"])] = float(row[column])
+    return [dict(item, difficulty=difficulties.get((item["Structure"], item["Dataset"]), item.get("difficulty")))
+            for item in pool]
+
+
+#
+# ExamGenerator
+#
+
+
+class ExamGenerator:
+    """Draws unique exams from a structure pool.
+
+    :param pool: list of {"Structure", "Dataset"} dictionaries, optionally with a "difficulty"
+    :param questionsPerDataset: number of questions per dataset, in the order they appear in the exam
+    :param difficultyTolerance: maximum difference between the total difficulty of an exam and the
+      average total difficulty of the pool, or None to not balance difficulty
+    :param maxAttempts: attempts per exam before giving up
+    """
+
+    def __init__(self, pool, questionsPerDataset=None, difficultyTolerance=None, maxAttempts=10000) -> None:
+        self.questionsPerDataset = dict(questionsPerDataset or DEFAULT_QUESTIONS_PER_DATASET)
+        self.difficultyTolerance = difficultyTolerance
+        self.maxAttempts = maxAttempts
+
+        self._candidates = {dataset: [] for dataset in self.questionsPerDataset}
+        seen = set()
+        for item in pool:
+            key = (item["Structure"], item["Dataset"])
+            if item["Dataset"] in self._candidates and key not in seen:
+                seen.add(key)
+                self._candidates[item["Dataset"]].append(item)
+        for dataset, count in self.questionsPerDataset.items():
+            if len(self._candidates[dataset]) < count:
+                raise ValueError(f"Pool has {len(self._candidates[dataset])} structures in {dataset}, {count} are needed")
+
+        self._targetDifficulty = None
+        if difficultyTolerance is not None:
+            # Strukturer utan svårighetsgrad räknas som genomsnittligt svåra
+            known = [item["difficulty"] for item in pool if item.get("difficulty") is not None]
+            if not known:
+                raise ValueError("Difficulty balancing needs a pool with difficulties")
+            self._defaultDifficulty = sum(known) / len(known)
+            self._targetDifficulty = 0.0
+            for dataset, count in self.questionsPerDataset.items():
+                difficulties = [self.difficulty(item) for item in self._candidates[dataset]]
+                self._targetDifficulty += count * sum(difficulties) / len(difficulties)
+
+    @property
+    def numberOfQuestions(self) -> int:
+        return sum(self.questionsPerDataset.values())
+
+    def difficulty(self, item) -> float:
+        value = item.get("difficulty")
+        return self._defaultDifficulty if value is None else value
+
+    def drawExam(self, rng) -> list:
+        """Draw one exam that satisfies the constraints, or None if the attempt failed."""
+        exam = []
+        structureNames = set()
+        # Datasetens ordning behålls, rng.sample blandar frågorna inom varje dataset
+        for dataset, count in self.questionsPerDataset.items():
+            for item in rng.sample(self._candidates[dataset], count):
+                name = item["Structure"].lower()
+                # Samma struktur får inte förekomma två gånger, inte ens i olika dataset
+                if name in structureNames:
+                    return None
+                structureNames.add(name)
+                exam.append(item)
+        if self._targetDifficulty is not None:
+            total = sum(self.difficulty(item) for item in exam)
+            if abs(total - self._targetDifficulty) > self.difficultyTolerance:
+                return None
+        return exam
+
+    def generate(self, count, seed, firstExamNumber=DEFAULT_FIRST_EXAM_NUMBER) -> dict:
+        """Generate count unique exams numbered from firstExamNumber."""
+        examBank = {}
+        generated = set()
+        for examNumber in range(firstExamNumber, firstExamNumber + count):
+            for attempt in range(self.maxAttempts):
+                # En egen generator per försök, så att ett prov inte beror på hur många
+                # slumptal de tidigare proven förbrukade
+                exam = self.drawExam(random.Random(f"{seed}:{examNumber}:{attempt}"))
+                if exam is None:
+                    continue
+                key = frozenset((item["Structure"], item["Dataset"]) for item in exam)
+                if key in generated:
+                    continue
+                generated.add(key)
+                break
+            else:
+                raise ValueError(f"Could not generate exam {examNumber} within {self.maxAttempts} attempts, "
+                                 f"the pool may be too small for {count} unique exams")
+            examBank[examNumber] = [{"Structure": item["Structure"], "Dataset": item["Dataset"], "question": str(i + 1)}
+                                    for i, item in enumerate(exam)]
+        return examBank
+
+
+def writeExamBank(examBank, path) -> None:
+    with open(path, "w", encoding="utf-8") as bankFile:
+        json.dump({str(examNumber): questions for examNumber, questions in examBank.items()}, bankFile,
+                  ensure_ascii=False, indent=1)
+
+
+def readExamBank(path) -> dict:
+    with open(path, encoding="utf-8") as bankFile:
+        return {int(examNumber): questions for examNumber, questions in json.load(bankFile).items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate randomized exams in the exam-bank format.")
+    parser.add_argument("pool", help="JSON file with a list of structures, or an existing exam bank to take structures from")
+    parser.add_argument("--count", type=int, required=True)
+    parser.add_argument("--seed", type=int, required=True)
+    parser.add_argument("--first-exam-number", type=int, default=DEFAULT_FIRST_EXAM_NUMBER)
+    parser.add_argument("--per-dataset", nargs="+", metavar="DATASET=COUNT",
+                        help="questions per dataset, default: " + " ".join(f"{k}={v}" for k, v in DEFAULT_QUESTIONS_PER_DATASET.items()))
+    parser.add_argument("--difficulty", help="summary CSV from ResultsAnalytics with a miss_rate per Structure and Dataset")
+    parser.add_argument("--difficulty-tolerance", type=float, default=0.5)
+    parser.add_argument("--output", default="ExamBank.json")
+    parser.add_argument("--append", action="store_true", help="keep the exams of the pool exam bank in the output")
+    args = parser.parse_args()
+
+    examBank = {}
+    with open(args.pool, encoding="utf-8") as poolFile:
+        pool = json.load(poolFile)
+    if isinstance(pool, dict):
+        if args.append:
+            examBank = readExamBank(args.pool)
+        pool = poolFromExamBank(pool)
+    elif args.append:
+        parser.error("--append needs an exam bank as pool")
+    if args.difficulty:
+        pool = applyDifficulties(pool, args.difficulty)
+    questionsPerDataset = None
+    if args.per_dataset:
+        questionsPerDataset = {}
+        for item in args.per_dataset:
+            dataset, count = item.split("=")
+            questionsPerDataset[dataset] = int(count)
+    balanced = args.difficulty or any(item.get("difficulty") is not None for item in pool)
+
+    generator = ExamGenerator(pool, questionsPerDataset, args.difficulty_tolerance if balanced else None)
+    if generator.numberOfQuestions != NUMBER_OF_QUESTIONS:
+        parser.error(f"exams must have {NUMBER_OF_QUESTIONS} questions, got {generator.numberOfQuestions}")
+    generated = generator.generate(args.count, args.seed, args.first_exam_number)
+    existing = sorted(set(examBank) & set(generated))
+    if existing:
+        parser.error(f"exam numbers {existing[0]}-{existing[-1]} already exist, choose another --first-exam-number")
+    examBank.update(generated)
+    writeExamBank(examBank, args.output)
+
+
+if __name__ == "__main__":
+    main()
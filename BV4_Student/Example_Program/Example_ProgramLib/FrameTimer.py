@@ -0,0 +1,55 @@
+"""Frame time statistics for the views rendered while a control point is being placed."""
+
+import time
+
+
+#
+# FrameTimer
+#
+
+
+class FrameTimer:
+    """Collects render durations per view.
+
+    startFrame/endFrame are called from the StartEvent and EndEvent of each view's
+    render window. summary() returns the number of frames and the mean, maximum and
+    total render time in milliseconds for each view.
+    """
+
+    def __init__(self, clock=time.perf_counter) -> None:
+        self.clock = clock
+        self.startedAt = clock()
+        self._frameStart = {}
+        self._frameCount = {}
+        self._totalTime = {}
+        self._maxTime = {}
+
+    def startFrame(self, view) -> None:
+        self._frameStart[view] = self.clock()
+
+    def endFrame(self, view) -> None:
+        start = self._frameStart.pop(view, None)
+        if start is None:
+            return
+        duration = self.clock() - start
+        self._frameCount[view] = self._frameCount.get(view, 0) + 1
+        self._totalTime[view] = self._totalTime.get(view, 0.0) + duration
+        self._maxTime[view] = max(self._maxTime.get(view, 0.0), duration)
+
+    def summary(self) -> dict:
+        return {view: {"frames": count,
+                       "mean_ms": 1000.0 * self._totalTime[view] / count,
+                       "max_ms": 1000.0 * self._maxTime[view],
+                       "total_ms": 1000.0 * self._totalTime[view]}
+                for view, count in self._frameCount.items()}
+
+    def formatSummary(self) -> str:
+        elapsed = self.clock() - self.startedAt
+        summary = self.summary()
+        totalFrames = sum(statistics["frames"] for statistics in summary.values())
+        totalTime = sum(statistics["total_ms"] for statistics in summary.values())
+        lines = [f"{totalFrames} frames, {totalTime:.1f} ms rendering in {elapsed:.2f} s"]
+        for view, statistics in sorted(summary.items()):
+            lines.append(f"  {view}: {statistics['frames']} frames, "
+                         f"mean {statistics['mean_ms']:.1f} ms, max {statistics['max_ms']:.1f} ms")
+        return "\n".join(lines)
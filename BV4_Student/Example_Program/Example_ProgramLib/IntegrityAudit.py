@@ -0,0 +1,219 @@
+"""
+Integrity audit of the datasets on an exam station.
+
+Files are hashed with SHA256 in a thread pool. Each file is read through a memory map
+in chunks, and hashlib releases the GIL while hashing, so several files are hashed in
+parallel. Digests are cached by path, size and modification time, so re-auditing files
+that have not changed does not read them again. Corruption on disk does not change the
+size or modification time, so an audit that must prove the integrity of the files
+should not use the cache (--no-cache); it still updates the cache for later audits.
+The result is written as a manifest that can be compared between stations.
+
+Examples:
+    python IntegrityAudit.py audit --manifest station01.json --cache audit_cache.json Big_Brain=/data/bigbrain.nrrd ...
+    python IntegrityAudit.py audit --manifest station01.json --cache audit_cache.json --no-cache Big_Brain=/data/bigbrain.nrrd ...
+    python IntegrityAudit.py compare station01.json station02.json
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import mmap
+import os
+import socket
+import sys
+import threading
+import time
+
+CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def sha256OfFile(path, chunkSize=CHUNK_SIZE) -> str:
+    """SHA256 of a file, read in chunks through a memory map."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as dataFile:
+        if os.fstat(dataFile.fileno()).st_size == 0:
+            # Tomma filer kan inte minnesmappas
+            return digest.hexdigest()
+        with mmap.mmap(dataFile.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, len(view), chunkSize):
+                    digest.update(view[offset:offset + chunkSize])
+            finally:
+                view.release()
+    return digest.hexdigest()
+
+
+#
+# HashCache
+#
+
+
+class HashCache:
+    """Digests of previously hashed files, valid as long as size and mtime are unchanged."""
+
+    def __init__(self, path=None) -> None:
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as cacheFile:
+                    self._entries = json.load(cacheFile)
+            except ValueError:
+                # En trasig cache byggs bara upp igen
+                self._entries = {}
+
+    def get(self, path, stat):
+        entry = self._entries.get(os.path.abspath(path))
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["sha256"]
+        return None
+
+    def set(self, path, stat, sha256) -> None:
+        with self._lock:
+            self._entries[os.path.abspath(path)] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        temporaryPath = self.path + ".tmp"
+        with open(temporaryPath, "w", encoding="utf-8") as cacheFile:
+            json.dump(self._entries, cacheFile, indent=1)
+        os.replace(temporaryPath, self.path)
+
+
+def auditFiles(files, cachePath=None, expectedChecksums=None, maxWorkers=None, useCache=True) -> dict:
+    """Hash files and return a manifest.
+
+    :param files: dictionary from a name that is the same on all stations (e.g. "Big_Brain") to a local path
+    :param cachePath: JSON file with cached digests, created if missing
+    :param expectedChecksums: dictionary from name to "SHA256:<hex>" or "<hex>", e.g. the Sample Data checksums
+    :param maxWorkers: number of hashing threads, default is the number of CPUs
+    :param useCache: if False, every file is hashed again and the new digests are written to the cache
+    """
+    expectedChecksums = expectedChecksums or {}
+    cache = HashCache(cachePath)
+    startTime = time.perf_counter()
+
+    def hashEntry(name, path):
+        entry = {"path": path}
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            entry["error"] = str(e)
+            return name, entry
+        entry["size"] = stat.st_size
+        sha256 = cache.get(path, stat) if useCache else None
+        entry["cached"] = sha256 is not None
+        if sha256 is None:
+            try:
+                sha256 = sha256OfFile(path)
+            except OSError as e:
+                # T.ex. en katalog, saknad läsrättighet eller en fil som togs bort efter os.stat
+                entry["error"] = str(e)
+                return name, entry
+            cache.set(path, stat, sha256)
+        entry["sha256"] = sha256
+        return name, entry
+
+    entries = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers or os.cpu_count()) as executor:
+        futures = [executor.submit(hashEntry, name, path) for name, path in files.items()]
+        for future in concurrent.futures.as_completed(futures):
+            name, entry = future.result()
+            entries[name] = entry
+    cache.save()
+
+    for name, entry in entries.items():
+        expected = expectedChecksums.get(name)
+        if expected is not None and "sha256" in entry:
+            expected = expected.split(":", 1)[-1].lower()
+            entry["expected_sha256"] = expected
+            entry["ok"] = entry["sha256"] == expected
+        else:
+            entry["ok"] = "sha256" in entry
+
+    return {
+        "station": socket.gethostname(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "seconds": round(time.perf_counter() - startTime, 3),
+        "files": dict(sorted(entries.items())),
+    }
+
+
+def writeManifest(manifest, path) -> None:
+    with open(path, "w", encoding="utf-8") as manifestFile:
+        json.dump(manifest, manifestFile, indent=1)
+
+
+def readManifest(path) -> dict:
+    with open(path, encoding="utf-8") as manifestFile:
+        return json.load(manifestFile)
+
+
+def compareManifests(reference, other) -> list:
+    """Return a list of human readable differences between two manifests, empty if they match."""
+    differences = []
+    referenceFiles = reference["files"]
+    otherFiles = other["files"]
+    station = other.get("station", "?")
+    for name in sorted(set(referenceFiles) | set(otherFiles)):
+        if name not in otherFiles:
+            differences.append(f"{name}: missing on {station}")
+        elif name not in referenceFiles:
+            differences.append(f"{name}: only on {station}")
+        elif referenceFiles[name].get("sha256") != otherFiles[name].get("sha256"):
+            differences.append(f"{name}: {referenceFiles[name].get('sha256')} != {otherFiles[name].get('sha256')} on {station}")
+    referenceStation = reference.get("station", "?")
+    for files, failedStation in ((referenceFiles, referenceStation), (otherFiles, station)):
+        for name, entry in sorted(files.items()):
+            if not entry.get("ok", False):
+                differences.append(f"{name}: failed verification on {failedStation}")
+    return differences
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Verify the integrity of station datasets.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    auditParser = subparsers.add_parser("audit", help="hash files and write a manifest")
+    auditParser.add_argument("files", nargs="+", metavar="NAME=PATH")
+    auditParser.add_argument("--manifest", required=True)
+    auditParser.add_argument("--cache", help="JSON file with cached digests")
+    auditParser.add_argument("--expected", help="manifest or JSON dictionary with expected checksums per name")
+    auditParser.add_argument("--workers", type=int)
+    auditParser.add_argument("--no-cache", action="store_true", help="hash every file again instead of using cached digests")
+    compareParser = subparsers.add_parser("compare", help="compare manifests with the first one")
+    compareParser.add_argument("manifests", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "audit":
+        files = dict(item.split("=", 1) for item in args.files)
+        expected = None
+        if args.expected:
+            with open(args.expected, encoding="utf-8") as expectedFile:
+                expected = json.load(expectedFile)
+            if "files" in expected:
+                expected = {name: entry["sha256"] for name, entry in expected["files"].items() if "sha256" in entry}
+        manifest = auditFiles(files, cachePath=args.cache, expectedChecksums=expected, maxWorkers=args.workers,
+                              useCache=not args.no_cache)
+        writeManifest(manifest, args.manifest)
+        failed = [name for name, entry in manifest["files"].items() if not entry["ok"]]
+        print(f"Audited {len(files)} files in {manifest['seconds']} s, {len(failed)} failed")
+        for name in failed:
+            print(f"  {name}: {manifest['files'][name].get('error', 'checksum mismatch')}")
+        sys.exit(1 if failed else 0)
+
+    reference = readManifest(args.manifests[0])
+    differences = []
+    for path in args.manifests[1:]:
+        differences += compareManifests(reference, readManifest(path))
+    for difference in differences:
+        print(difference)
+    sys.exit(1 if differences else 0)
+
+
+if __name__ == "__main__":
+    main()
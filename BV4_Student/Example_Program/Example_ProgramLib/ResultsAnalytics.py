@@ -0,0 +1,260 @@
+"""
+Per-structure analytics over saved exam results.
+
+Results written by ResultsCollector (JSON Lines, one exam per line) are flattened into one
+row per question and kept as columnar NumPy arrays. Text columns are stored as integer codes
+plus a category table, so grouping and aggregation are done with np.unique and np.bincount
+instead of Python loops. Parsed tables can be saved as .npz, or as Parquet when pyarrow is
+installed, so later analyses of several years of cohorts skip the JSON parsing.
+
+Example:
+    python ResultsAnalytics.py results_2025.jsonl results_2026.jsonl --by Structure Dataset --output summary.csv
+"""
+
+import argparse
+import csv
+import json
+import os
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Textkolumner som lagras som koder + kategorier
+CATEGORICAL_COLUMNS = ("student_name", "exam_nr", "station", "Structure", "Dataset")
+NUMERIC_COLUMNS = ("question", "answered", "saved_at", "x", "y", "z")
+GROUP_COLUMNS = CATEGORICAL_COLUMNS + ("question",)
+
+
+#
+# ResultsTable
+#
+
+
+class ResultsTable:
+    """One row per answered or unanswered question in a saved exam.
+
+    Categorical columns are stored in self.codes (int32 arrays) with their labels in
+    self.categories, numeric columns are stored in self.values.
+    """
+
+    def __init__(self, codes, categories, values) -> None:
+        self.codes = codes
+        self.categories = categories
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.values["question"])
+
+    @classmethod
+    def fromResults(cls, results):
+        """Build a table from an iterable of exam result dictionaries."""
+        text = {name: [] for name in CATEGORICAL_COLUMNS}
+        question = []
+        answered = []
+        savedAt = []
+        positions = []
+        submissionIds = set()
+        for result in results:
+            # Samma inskickade resultat kan finnas flera gånger, t.ex. i sammanslagna resultatfiler
+            submissionId = result.get("submission_id")
+            if submissionId is not None:
+                if submissionId in submissionIds:
+                    continue
+                submissionIds.add(submissionId)
+            questions = result.get("questions", [])
+            count = len(questions)
+            for name in ("student_name", "exam_nr", "station"):
+                text[name].extend([str(result.get(name, ""))] * count)
+            savedAt.extend([float(result.get("saved_at", np.nan))] * count)
+            for item in questions:
+                text["Structure"].append(str(item.get("Structure", "")))
+                text["Dataset"].append(str(item.get("Dataset", "")))
+                question.append(int(item.get("question", 0)))
+                answered.append(bool(item.get("answered", False)))
+                positions.append(item.get("position") or (np.nan, np.nan, np.nan))
+
+        codes = {}
+        categories = {}
+        for name in CATEGORICAL_COLUMNS:
+            categories[name], inverse = np.unique(np.array(text[name], dtype=str), return_inverse=True)
+            codes[name] = inverse.astype(np.int32)
+        positions = np.array(positions, dtype=np.float64).reshape(-1, 3)
+        values = {
+            "question": np.array(question, dtype=np.int32),
+            "answered": np.array(answered, dtype=bool),
+            "saved_at": np.array(savedAt, dtype=np.float64),
+            "x": positions[:, 0].copy(),
+            "y": positions[:, 1].copy(),
+            "z": positions[:, 2].copy(),
+        }
+        return cls(codes, categories, values)
+
+    @classmethod
+    def fromJsonLines(cls, paths):
+        """Load one or more results stores written by ResultsCollector."""
+        if isinstance(paths, (str, os.PathLike)):
+            paths = [paths]
+
+        def readResults():
+            for path in paths:
+                with open(path, encoding="utf-8") as storeFile:
+                    for line in storeFile:
+                        if line.strip():
+                            yield json.loads(line)
+
+        return cls.fromResults(readResults())
+
+    @classmethod
+    def concatenate(cls, tables):
+        """Combine several tables, for example one per cohort, into one."""
+        codes = {}
+        categories = {}
+        for name in CATEGORICAL_COLUMNS:
+            categories[name] = np.unique(np.concatenate([table.categories[name] for table in tables]))
+            # Koda om varje tabell mot de gemensamma kategorierna
+            codes[name] = np.concatenate([
+                np.searchsorted(categories[name], table.categories[name])[table.codes[name]].astype(np.int32)
+                for table in tables])
+        values = {name: np.concatenate([table.values[name] for table in tables]) for name in NUMERIC_COLUMNS}
+        return cls(codes, categories, values)
+
+    def column(self, name):
+        """Return a column as an array. Categorical columns are decoded to strings."""
+        if name in self.codes:
+            return self.categories[name][self.codes[name]]
+        return self.values[name]
+
+    def save(self, path) -> None:
+        """Save the table as .npz, or as .parquet when pyarrow is available."""
+        if path.endswith(".parquet"):
+            if pa is None:
+                raise ImportError("pyarrow is required to write Parquet files")
+            arrays = {name: pa.DictionaryArray.from_arrays(self.codes[name], self.categories[name].tolist())
+                      for name in CATEGORICAL_COLUMNS}
+            arrays.update({name: pa.array(self.values[name]) for name in NUMERIC_COLUMNS})
+            pq.write_table(pa.table(arrays), path)
+            return
+        arrays = {}
+        for name in CATEGORICAL_COLUMNS:
+            arrays[f"codes_{name}"] = self.codes[name]
+            arrays[f"categories_{name}"] = self.categories[name]
+        for name in NUMERIC_COLUMNS:
+            arrays[f"values_{name}"] = self.values[name]
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Load a table saved with save(). JSON Lines stores are parsed with fromJsonLines()."""
+        if path.endswith(".jsonl") or path.endswith(".json"):
+            return cls.fromJsonLines(path)
+        if path.endswith(".parquet"):
+            if pq is None:
+                raise ImportError("pyarrow is required to read Parquet files")
+            arrowTable = pq.read_table(path)
+            codes = {}
+            categories = {}
+            for name in CATEGORICAL_COLUMNS:
+                column = arrowTable.column(name).combine_chunks()
+                if not pa.types.is_dictionary(column.type):
+                    column = column.dictionary_encode()
+                # Kategorierna hålls sorterade så att concatenate() kan koda om med searchsorted
+                categories[name], remap = np.unique(np.array(column.dictionary.to_pylist(), dtype=str), return_inverse=True)
+                codes[name] = remap[column.indices.to_numpy(zero_copy_only=False)].astype(np.int32)
+            values = {name: arrowTable.column(name).to_numpy() for name in NUMERIC_COLUMNS}
+            return cls(codes, categories, values)
+        with np.load(path) as arrays:
+            codes = {name: arrays[f"codes_{name}"] for name in CATEGORICAL_COLUMNS}
+            categories = {name: arrays[f"categories_{name}"] for name in CATEGORICAL_COLUMNS}
+            values = {name: arrays[f"values_{name}"] for name in NUMERIC_COLUMNS}
+        return cls(codes, categories, values)
+
+
+def summarize(table, by=("Structure", "Dataset")):
+    """Aggregate the table grouped by the given columns.
+
+    Returns a dictionary of equally long columns with the group keys followed by
+    the number of questions, how many were missed (not placed), the miss rate and
+    the mean and standard deviation of the placed positions.
+    """
+    for name in by:
+        if name not in GROUP_COLUMNS:
+            raise ValueError(f"Cannot group by {name}, choose from {', '.join(GROUP_COLUMNS)}")
+    if len(table) == 0:
+        statistics = [f"{statistic}_{axis}" for axis in ("x", "y", "z") for statistic in ("mean", "std")]
+        return {name: np.array([]) for name in list(by) + ["count", "missed", "miss_rate"] + statistics}
+
+    keyCodes = []
+    keyLabels = []
+    for name in by:
+        if name in table.codes:
+            keyCodes.append(table.codes[name])
+            keyLabels.append(table.categories[name])
+        else:
+            labels, inverse = np.unique(table.values[name], return_inverse=True)
+            keyCodes.append(inverse)
+            keyLabels.append(labels)
+    # Slå ihop grupperingskolumnerna till en gruppkod per rad
+    combined = np.ravel_multi_index(keyCodes, [len(labels) for labels in keyLabels])
+    groupKeys, groups = np.unique(combined, return_inverse=True)
+    groupCount = len(groupKeys)
+
+    answered = table.values["answered"]
+    count = np.bincount(groups, minlength=groupCount)
+    placed = np.bincount(groups, weights=answered, minlength=groupCount)
+
+    summary = {}
+    for name, labels, keyIndex in zip(by, keyLabels, np.unravel_index(groupKeys, [len(labels) for labels in keyLabels])):
+        summary[name] = labels[keyIndex]
+    summary["count"] = count
+    summary["missed"] = count - placed.astype(np.int64)
+    summary["miss_rate"] = summary["missed"] / count
+
+    placedGroups = groups[answered]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for axis in ("x", "y", "z"):
+            coordinates = table.values[axis][answered]
+            total = np.bincount(placedGroups, weights=coordinates, minlength=groupCount)
+            totalSquared = np.bincount(placedGroups, weights=coordinates * coordinates, minlength=groupCount)
+            mean = total / placed
+            summary[f"mean_{axis}"] = mean
+            summary[f"std_{axis}"] = np.sqrt(np.maximum(totalSquared / placed - mean * mean, 0.0))
+    return summary
+
+
+def writeSummaryCsv(summary, path) -> None:
+    columns = list(summary.keys())
+    with open(path, "w", newline="", encoding="utf-8") as csvFile:
+        writer = csv.writer(csvFile)
+        writer.writerow(columns)
+        writer.writerows(zip(*[summary[name].tolist() for name in columns]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Summarize exam results per structure.")
+    parser.add_argument("inputs", nargs="+", help="results stores (.jsonl) or saved tables (.npz, .parquet)")
+    parser.add_argument("--by", nargs="+", default=["Structure", "Dataset"], choices=GROUP_COLUMNS)
+    parser.add_argument("--output", help="CSV file for the summary, printed to stdout if omitted")
+    parser.add_argument("--save-table", help="save the combined table as .npz or .parquet for faster reloading")
+    args = parser.parse_args()
+
+    table = ResultsTable.concatenate([ResultsTable.load(path) for path in args.inputs])
+    if args.save_table:
+        table.save(args.save_table)
+    summary = summarize(table, by=args.by)
+    if args.output:
+        writeSummaryCsv(summary, args.output)
+    else:
+        columns = list(summary.keys())
+        print("\t".join(columns))
+        for row in zip(*[summary[name].tolist() for name in columns]):
+            print("\t".join(str(value) for value in row))
+
+
+if __name__ == "__main__":
+    main()
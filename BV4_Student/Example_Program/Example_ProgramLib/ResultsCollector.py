@@ -0,0 +1,339 @@
+"""
+Collector for finished exam results.
+
+The collector is a small asyncio TCP server that runs on localhost or on the exam LAN.
+Stations send one JSON document per line and the collector answers with "OK" once the
+result has been written to the results store (a JSON Lines file). Results from all
+connections are put on one bounded queue and written in batches, so memory use stays
+bounded and slow disks push back on the stations instead of growing the queue. A batch
+is written as soon as no more results are queued, so a single station never waits for
+a batch to fill up.
+
+Delivery is at-least-once: a station that times out waiting for "OK" sends the result
+again. Every result carries a SUBMISSION_ID_KEY set by ResultsClient, and the collector
+only writes the first copy of each submission.
+
+The station side is ResultsClient, which keeps a persistent connection in a background
+thread and spools each result to disk before sending it, so saving never waits on the network.
+
+Run the collector with:
+    python ResultsCollector.py --host 0.0.0.0 --port 8765 --store results.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+ACK = b"OK\n"
+NACK = b"ERROR\n"
+
+# Unikt id per inskickat resultat, används för att ta bort dubbletter
+SUBMISSION_ID_KEY = "submission_id"
+
+# Största tillåtna storlek på ett resultat (en rad) i bytes
+MAX_PAYLOAD_SIZE = 1024 * 1024
+
+
+#
+# ResultsCollector
+#
+
+
+class ResultsCollector:
+    """Receives exam results from stations and appends them to a JSON Lines store.
+
+    :param storePath: file that results are appended to
+    :param maxQueueSize: number of results that may wait for the writer before readers block
+    :param maxBatchSize: maximum number of results written per batch
+    :param flushInterval: maximum seconds the writer keeps adding results that are still queued to a batch
+    """
+
+    def __init__(self, storePath, maxQueueSize=1000, maxBatchSize=100, flushInterval=0.5) -> None:
+        self.storePath = storePath
+        self.maxQueueSize = maxQueueSize
+        self.maxBatchSize = maxBatchSize
+        self.flushInterval = flushInterval
+        self.host = None
+        self.port = None
+        self.resultsWritten = 0
+        self.duplicatesDropped = 0
+        self._submissionIds = set()
+        self._queue = None
+        self._server = None
+        self._writerTask = None
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT) -> None:
+        """Start listening. Port 0 picks a free port, which is then available in self.port."""
+        self._submissionIds = await asyncio.to_thread(self._readSubmissionIds)
+        self._queue = asyncio.Queue(maxsize=self.maxQueueSize)
+        self._writerTask = asyncio.create_task(self._writeBatches())
+        self._server = await asyncio.start_server(self._handleConnection, host, port, limit=MAX_PAYLOAD_SIZE)
+        self.host, self.port = self._server.sockets[0].getsockname()[:2]
+        logging.info(f"Results collector listening on {self.host}:{self.port}, writing to {self.storePath}")
+
+    async def serveForever(self) -> None:
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self) -> None:
+        """Stop accepting connections and write everything that is still queued."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._writerTask is not None:
+            await self._queue.join()
+            self._writerTask.cancel()
+            try:
+                await self._writerTask
+            except asyncio.CancelledError:
+                pass
+            self._writerTask = None
+
+    async def _handleConnection(self, reader, writer) -> None:
+        peer = writer.get_extra_info("peername")
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Raden är längre än MAX_PAYLOAD_SIZE
+                    logging.warning(f"Payload from {peer} is too large, closing connection")
+                    break
+                if not line:
+                    break
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    logging.warning(f"Invalid payload from {peer}")
+                    writer.write(NACK)
+                    await writer.drain()
+                    continue
+                written = asyncio.get_running_loop().create_future()
+                # Blockerar när kön är full, vilket ger back-pressure mot stationen
+                await self._queue.put((result, written))
+                try:
+                    await written
+                except OSError as e:
+                    logging.error(f"Could not write result from {peer}: {e}")
+                    writer.write(NACK)
+                else:
+                    writer.write(ACK)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _writeBatches(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.flushInterval
+            while len(batch) < self.maxBatchSize and time.monotonic() < deadline:
+                if self._queue.empty():
+                    # Låt andra anslutningar lägga till resultat de redan har läst, men vänta
+                    # inte på nya resultat. Varje station väntar på "OK" innan den skickar nästa.
+                    await asyncio.sleep(0)
+                    if self._queue.empty():
+                        break
+                batch.append(self._queue.get_nowait())
+            # Ett resultat som redan skrivits (t.ex. skickat igen efter timeout) kvitteras
+            # men skrivs inte en gång till
+            results = []
+            batchIds = set()
+            for result, _written in batch:
+                submissionId = result.get(SUBMISSION_ID_KEY) if isinstance(result, dict) else None
+                if submissionId is not None and (submissionId in self._submissionIds or submissionId in batchIds):
+                    self.duplicatesDropped += 1
+                    continue
+                if submissionId is not None:
+                    batchIds.add(submissionId)
+                results.append(result)
+            try:
+                if results:
+                    await asyncio.to_thread(self._appendToStore, results)
+            except OSError as e:
+                for _result, written in batch:
+                    if not written.done():
+                        written.set_exception(e)
+            else:
+                self._submissionIds.update(batchIds)
+                self.resultsWritten += len(results)
+                for _result, written in batch:
+                    if not written.done():
+                        written.set_result(True)
+            finally:
+                for _item in batch:
+                    self._queue.task_done()
+
+    def _readSubmissionIds(self) -> set:
+        submissionIds = set()
+        if not os.path.exists(self.storePath):
+            return submissionIds
+        with open(self.storePath, encoding="utf-8") as storeFile:
+            for line in storeFile:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(result, dict) and SUBMISSION_ID_KEY in result:
+                    submissionIds.add(result[SUBMISSION_ID_KEY])
+        return submissionIds
+
+    def _appendToStore(self, results) -> None:
+        data = "".join(json.dumps(result, ensure_ascii=False) + "\n" for result in results)
+        with open(self.storePath, "a", encoding="utf-8") as storeFile:
+            storeFile.write(data)
+            storeFile.flush()
+            os.fsync(storeFile.fileno())
+
+
+#
+# ResultsClient
+#
+
+
+class ResultsClient:
+    """Sends exam results to a ResultsCollector from a background thread.
+
+    Every submitted result is first written to the spool directory, so results survive
+    a restart of the station or an unreachable collector. The background thread keeps one
+    connection open, sends the spooled results in order and removes each file once the
+    collector has acknowledged it.
+
+    :param host: collector host
+    :param port: collector port
+    :param spoolDirectory: directory where results wait until they have been sent
+    :param timeout: socket timeout in seconds
+    :param retryInterval: seconds to wait before reconnecting after a failure
+    """
+
+    def __init__(self, host, port, spoolDirectory, timeout=5.0, retryInterval=2.0) -> None:
+        self.host = host
+        self.port = port
+        self.spoolDirectory = spoolDirectory
+        self.timeout = timeout
+        self.retryInterval = retryInterval
+        self._pending = queue.Queue()
+        self._stopEvent = threading.Event()
+        self._socket = None
+        self._socketFile = None
+        os.makedirs(self.spoolDirectory, exist_ok=True)
+        # Skicka resultat som blev kvar från en tidigare session först
+        for fileName in sorted(os.listdir(self.spoolDirectory)):
+            if fileName.endswith(".json"):
+                self._pending.put(os.path.join(self.spoolDirectory, fileName))
+        self._thread = threading.Thread(target=self._run, name="ResultsClient", daemon=True)
+        self._thread.start()
+
+    def submit(self, result) -> str:
+        """Spool the result and queue it for sending. Returns immediately with the spool file path."""
+        submissionId = uuid.uuid4().hex
+        fileName = f"{time.time_ns():020d}_{submissionId}.json"
+        path = os.path.join(self.spoolDirectory, fileName)
+        temporaryPath = path + ".tmp"
+        with open(temporaryPath, "w", encoding="utf-8") as spoolFile:
+            json.dump(dict(result, **{SUBMISSION_ID_KEY: submissionId}), spoolFile, ensure_ascii=False)
+        os.replace(temporaryPath, path)
+        self._pending.put(path)
+        return path
+
+    def pendingCount(self) -> int:
+        return self._pending.unfinished_tasks
+
+    def waitUntilSent(self, timeout=None) -> bool:
+        """Wait until every submitted result has been acknowledged. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._pending.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self) -> None:
+        """Stop the background thread. Unsent results stay in the spool directory."""
+        self._stopEvent.set()
+        self._pending.put(None)
+        self._thread.join()
+        self._disconnect()
+
+    def _run(self) -> None:
+        while not self._stopEvent.is_set():
+            path = self._pending.get()
+            if path is None:
+                self._pending.task_done()
+                break
+            while not self._stopEvent.is_set():
+                try:
+                    self._send(path)
+                    break
+                except OSError as e:
+                    logging.warning(f"Could not send result to {self.host}:{self.port}: {e}")
+                    self._disconnect()
+                    self._stopEvent.wait(self.retryInterval)
+            self._pending.task_done()
+
+    def _send(self, path) -> None:
+        try:
+            with open(path, "rb") as spoolFile:
+                data = json.dumps(json.load(spoolFile), ensure_ascii=False).encode("utf-8")
+        except FileNotFoundError:
+            return
+        except ValueError:
+            logging.error(f"Spooled result {path} is corrupt and will not be sent")
+            os.replace(path, path + ".corrupt")
+            return
+        if self._socket is None:
+            self._socket = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            self._socketFile = self._socket.makefile("rb")
+        self._socket.sendall(data + b"\n")
+        reply = self._socketFile.readline()
+        if reply != ACK:
+            raise OSError(f"collector replied {reply!r}")
+        os.remove(path)
+
+    def _disconnect(self) -> None:
+        if self._socketFile is not None:
+            self._socketFile.close()
+            self._socketFile = None
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Collect exam results from all stations.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--store", default="results.jsonl", help="JSON Lines file that results are appended to")
+    parser.add_argument("--max-queue-size", type=int, default=1000)
+    parser.add_argument("--max-batch-size", type=int, default=100)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    async def run():
+        collector = ResultsCollector(args.store, maxQueueSize=args.max_queue_size, maxBatchSize=args.max_batch_size)
+        await collector.start(args.host, args.port)
+        try:
+            await collector.serveForever()
+        finally:
+            await collector.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Helpers for the Example_Program module that do not depend on Slicer."""